@@ -0,0 +1,68 @@
+'''
+Context stack benchmark.
+
+    python -m benchmarks.context
+
+Times push/pop cycles, lookups of outer names from deep in the stack, and
+repeated len/iteration over an unchanged Context.
+'''
+
+import timeit
+
+from contemplation import Context
+
+
+def bench(label, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print('%-24s %8.2f us' % (label, best * 1e6))
+
+
+def main(depth=20, names=200):
+    data = {'name%d' % n: n for n in range(names)}
+
+    def push_pop(depth):
+        def func():
+            context = Context(data)
+            for n in range(depth):
+                context.push(level=n)
+            for n in range(depth):
+                context.pop()
+        return func
+
+    def nested_with():
+        # As a custom tag using "with context.push()" would
+        context = Context(data)
+        def enter(level):
+            with context.push(level=level):
+                if level < depth:
+                    enter(level + 1)
+        enter(0)
+
+    deep = Context(data)
+    for n in range(depth):
+        deep.push({'level': n})
+
+    def lookups():
+        for n in range(0, names, 10):
+            deep['name%d' % n]
+            deep['level']
+
+    def missing():
+        for n in range(20):
+            deep.get('missing%d' % n)
+
+    def sizes():
+        for n in range(10):
+            len(deep)
+            list(deep)
+
+    bench('push/pop x%d' % depth, push_pop(depth), 2000)
+    bench('push/pop x2000', push_pop(2000), 20)
+    bench('nested with x%d' % depth, nested_with, 2000)
+    bench('lookups at depth %d' % depth, lookups, 5000)
+    bench('missing at depth %d' % depth, missing, 5000)
+    bench('len/iter x10', sizes, 500)
+
+
+if __name__ == '__main__':
+    main()
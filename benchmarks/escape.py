@@ -0,0 +1,69 @@
+'''
+HTML escaping benchmark.
+
+    python -m benchmarks.escape
+
+Compares escape_text with the naive chain of replace() calls, and with a
+str.translate table, on values with and without characters to escape.
+Then renders a template of many variables with and without autoescape.
+'''
+
+import timeit
+
+from contemplation import Context, Template
+from contemplation.safestring import escape_text
+
+TABLE = {
+    ord('&'): '&amp;',
+    ord('<'): '&lt;',
+    ord('>'): '&gt;',
+    ord('"'): '&quot;',
+    ord("'"): '&#x27;',
+}
+
+VALUES = [
+    ('short clean', 'Hello World'),
+    ('short dirty', 'Tom & Jerry <3'),
+    ('long clean', 'lorem ipsum dolor sit amet ' * 100),
+    ('long dirty', 'a <b>bold</b> & "quoted" word ' * 100),
+]
+
+
+def naive(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace(
+        '>', '&gt;').replace('"', '&quot;').replace("'", '&#x27;')
+
+
+def translate(text):
+    return text.translate(TABLE)
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print('%-12s %10s %10s %10s' % ('', 'replace', 'translate', 'escape'))
+    for label, text in VALUES:
+        print('%-12s %7.3f us %7.3f us %7.3f us' % (
+            label,
+            bench(lambda: naive(text), 20000),
+            bench(lambda: translate(text), 20000),
+            bench(lambda: escape_text(text), 20000),
+        ))
+
+    source = '{% for row in rows %}<td>{{ row.name }}</td><td>{{ row.note }}</td>{% endfor %}'
+    rows = [
+        {'name': 'Item %d' % n, 'note': 'x < y' if n % 10 == 0 else 'plain'}
+        for n in range(500)
+    ]
+    print()
+    for autoescape in (False, True):
+        template = Template(source, compiled=True, autoescape=autoescape)
+        print('render, autoescape=%-5s %8.1f us' % (
+            autoescape, bench(lambda: template.render(Context({'rows': rows})), 200),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Dotted variable lookup benchmark.
+
+    python -m benchmarks.lookups
+
+Reports the time per render, and how many exceptions were raised in the
+lookup code (any frame in contemplation/base.py) while rendering, for a
+table of model-like objects.
+'''
+
+import sys
+import timeit
+
+from contemplation import Template, Context
+from contemplation import base
+
+SOURCE = '''{% for user in users %}
+{{ user.profile.name }} {{ user.profile.email }} {{ user.tags.0 }} {{ user.name.upper }}
+{% endfor %}'''
+
+
+class Profile(object):
+    def __init__(self, n):
+        self.name = 'Name %d' % n
+        self.email = 'user%d@example.com' % n
+
+class User(object):
+    def __init__(self, n):
+        self.name = 'user%d' % n
+        self.profile = Profile(n)
+        self.tags = ['tag%d' % n, 'other']
+
+
+def count_exceptions(func):
+    '''
+    Count exceptions raised within frames of contemplation/base.py.  One
+    passing up through several of those frames is counted once.
+    '''
+    filename = base.lookup.__code__.co_filename
+    count = [0]
+    last = [None]
+    def tracer(frame, event, arg):
+        if frame.f_code.co_filename == filename:
+            if event == 'exception' and arg[1] is not last[0]:
+                last[0] = arg[1]
+                count[0] += 1
+            return tracer
+        return None
+    sys.settrace(tracer)
+    try:
+        func()
+    finally:
+        sys.settrace(None)
+    return count[0]
+
+
+def main(rows=100, number=50):
+    template = Template(SOURCE)
+    data = {'users': [User(n) for n in range(rows)]}
+    render = lambda: template.render(Context(data))
+
+    render()
+    exceptions = count_exceptions(render)
+    best = min(timeit.repeat(render, number=number, repeat=5)) / number
+    print('rows: %d' % rows)
+    print('render: %.3f ms' % (best * 1000))
+    print('exceptions per render: %d' % exceptions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+'''
+Method call memoisation benchmark.
+
+    python -m benchmarks.memoise
+
+Renders a page which shows the same method results in the header, the
+sidebar and every row of a table, with and without a memoising Context.
+get_full_name is cheap, lifetime_total sums over every order.
+'''
+
+import timeit
+
+from contemplation import Context, Template
+
+SOURCE = '''<h1>{{ user.get_full_name }}</h1>
+<aside>{{ user.get_full_name }} ({{ user.lifetime_total }})</aside>
+<table>{% for order in orders %}
+<tr><td>{{ order.number }}</td><td>{{ user.get_full_name }}</td><td>{{ order.total }}</td><td>{{ order.total }} of {{ user.lifetime_total }}</td></tr>
+{% endfor %}</table>
+'''
+
+
+class User(object):
+    def __init__(self, first, last, orders):
+        self.first = first
+        self.last = last
+        self.orders = orders
+
+    def get_full_name(self):
+        return ('%s %s' % (self.first, self.last)).strip().title()
+
+    def lifetime_total(self):
+        return sum(order.total() for order in self.orders)
+
+
+class Order(object):
+    def __init__(self, number, lines):
+        self.number = number
+        self.lines = lines
+
+    def total(self):
+        return sum(price * quantity for price, quantity in self.lines)
+
+
+def main(rows=200, repeat=5):
+    orders = [Order(n, [(n % 7 + 1, 2), (3, n % 5 + 1), (10, 1)]) for n in range(rows)]
+    user = User('ada', 'lovelace', orders)
+    template = Template(SOURCE, compiled=True)
+    results = {}
+    for memoise in (False, True):
+        results[memoise] = min(timeit.repeat(
+            lambda: template.render(Context({'user': user, 'orders': orders}, memoise=memoise)),
+            number=100, repeat=repeat,
+        )) / 100
+    assert template.render(Context({'user': user, 'orders': orders})) == \
+        template.render(Context({'user': user, 'orders': orders}, memoise=True))
+    print('plain     %8.1f us/render' % (results[False] * 1e6))
+    print('memoise   %8.1f us/render  x%.2f' % (results[True] * 1e6, results[False] / results[True]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+'''
+Template memory benchmark.
+
+    python -m benchmarks.memory [-o results.json] [--baseline old.json]
+
+Loads a few typical templates and reports the memory they keep per 1000
+nodes.  The source is made before measuring starts, and the template only
+refers to it, so it isn't counted.
+
+Save the results of one version with -o, then pass them as --baseline
+when running another to see the bytes saved.
+'''
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from contemplation import Template
+
+SAMPLES = {
+    'text': '<p class="x">Some text</p>\n<span>{{ user.name }}</span>\n',
+    'vars': '<td>{{ item.title }}</td><td>{{ item.price|default:"-" }}</td>\n',
+    'tags': (
+        '{% for item in items %}<li>{% with t=item.title %}{{ t }}{% endwith %}'
+        '</li>{% empty %}<li>None</li>{% endfor %}\n'
+    ),
+}
+
+
+def count_nodes(nodelist):
+    total = 0
+    for node in nodelist:
+        total += 1
+        for name in node.child_nodelists:
+            total += count_nodes(getattr(node, name))
+    return total
+
+
+def retained(source):
+    '''Return (bytes kept, node count) for a template of ``source``.'''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        template = Template(source)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before, count_nodes(template.root.nodelist)
+
+
+def measure(repeat=200):
+    results = {}
+    for name, chunk in sorted(SAMPLES.items()):
+        # Unique names per copy, as in a real template
+        source = ''.join(chunk.replace('item', 'item%d' % n) for n in range(repeat))
+        size, nodes = retained(source)
+        results[name] = size * 1000.0 / nodes
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.memory')
+    parser.add_argument('-o', '--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    results = measure()
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(results, fout, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)
+    else:
+        baseline = {}
+
+    print('bytes per 1k nodes')
+    print('%-6s %10s %10s %10s' % ('sample', 'before', 'after', 'saved'))
+    for name, size in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            print('%-6s %10s %10.0f %10s' % (name, '-', size, '-'))
+        else:
+            print('%-6s %10.0f %10.0f %10.0f' % (name, before, size, before - size))
+
+
+if __name__ == '__main__':
+    main()
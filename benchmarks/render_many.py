@@ -0,0 +1,54 @@
+'''
+Bulk render benchmark.
+
+    python -m benchmarks.render_many [count]
+
+Renders one template with many contexts in a plain loop, then with
+render_many for 1, 2, 4... workers up to the CPU count.
+'''
+
+import os
+import sys
+import time
+
+from contemplation import Context, Template, render_many
+
+SOURCE = '''Dear {{ user.name }},
+{% for item in items %}  {{ forloop.counter }}. {{ item.title }} - {{ item.price }}
+{% empty %}  Nothing new.
+{% endfor %}Thanks, {{ sender }}
+'''
+
+
+def contexts(count):
+    for n in range(count):
+        yield {
+            'user': {'name': 'User %d' % n},
+            'items': [{'title': 'Item %d' % i, 'price': i * n} for i in range(n % 10)],
+            'sender': 'The Team',
+        }
+
+
+def main(count=100000):
+    template = Template(SOURCE, compiled=True)
+
+    start = time.perf_counter()
+    for data in contexts(count):
+        template.render(Context(data))
+    base = time.perf_counter() - start
+    print('%-12s %8.0f renders/s' % ('loop', count / base))
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        for output in render_many(template, contexts(count), workers=workers, chunk_size=500):
+            pass
+        elapsed = time.perf_counter() - start
+        print('%-12s %8.0f renders/s  x%.2f' % (
+            '%d workers' % workers, count / elapsed, base / elapsed,
+        ))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,43 @@
+'''
+Columnar render benchmark.
+
+    python -m benchmarks.render_rows [count]
+
+Renders a report row template once per row with a Context, then over the
+same data as columns with render_rows.
+'''
+
+import sys
+import time
+
+from contemplation import Context, Template, render_rows
+
+SOURCE = '<tr><td>{{ user.name }}</td><td>{{ user.email|lower }}</td><td>{{ total }}</td></tr>\n'
+
+
+def main(count=200000):
+    template = Template(SOURCE, compiled=True)
+    columns = {
+        'user.name': ['User %d' % n for n in range(count)],
+        'user.email': ['User%d@Example.com' % n for n in range(count)],
+        'total': list(range(count)),
+    }
+    rows = [
+        {'user': {'name': name, 'email': email}, 'total': total}
+        for name, email, total in zip(columns['user.name'], columns['user.email'], columns['total'])
+    ]
+
+    start = time.perf_counter()
+    for data in rows:
+        template.render(Context(data))
+    base = time.perf_counter() - start
+    print('%-12s %8.0f rows/s' % ('loop', count / base))
+
+    start = time.perf_counter()
+    render_rows(template, columns)
+    elapsed = time.perf_counter() - start
+    print('%-12s %8.0f rows/s  x%.2f' % ('render_rows', count / elapsed, base / elapsed))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
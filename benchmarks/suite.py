@@ -0,0 +1,232 @@
+'''
+Benchmark suite, for catching performance regressions between versions.
+
+    python -m benchmarks.suite run [-o results.json] [--repeat 5] [-k name]
+    python -m benchmarks.suite compare old.json new.json [--threshold 0.1]
+
+Each synthetic template is timed separately for tokenise, parse, render
+(from nodes, and compiled) and variable resolution, taking the best of
+``repeat`` runs.  Peak memory while loading and rendering is measured
+with tracemalloc.  Results are written as JSON.
+
+compare prints the change in each figure, and exits with status 1 if any
+got worse by more than ``threshold`` (a fraction: 0.1 is 10%).
+
+Uses only the standard library, and the templates and data are fixed, so
+runs on one machine are comparable.
+'''
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from contemplation import Context, Template
+from contemplation.base import FilterExpression, parse, tokenise
+
+
+class Case(object):
+    '''A synthetic template, the data to render it with, and some paths to resolve.'''
+    def __init__(self, name, source, data, paths):
+        self.name = name
+        self.source = source
+        self.data = data
+        self.paths = paths
+
+
+class Source(object):
+    '''Just enough of a Template for parse().'''
+    def __init__(self, source):
+        self.source = source
+        self.name = None
+        self.autoescape = True
+
+
+class Item(object):
+    def __init__(self, n):
+        self.title = 'Item %d' % n
+        self.price = n * 3
+        self.tags = ['t%d' % n, 'other']
+
+
+def large_text():
+    chunk = (
+        '<tr><td class="cell">Some static text for the body of the page'
+        ' which runs on for a while</td></tr>\n'
+    )
+    source = (chunk * 200 + '<p>{{ user.name }}</p>\n') * 50
+    return Case('large_text', source, {'user': {'name': 'Someone'}}, ['user.name'])
+
+
+def deep_nesting():
+    depth = 40
+    source = ''.join('{%% with v%d=v%d %%}<div>' % (n + 1, n) for n in range(depth))
+    source += '{{ v%d }}' % depth
+    source += '</div>{% endwith %}' * depth
+    loops = '{% for a in rows %}{% for b in a %}{% for c in b %}{% for d in c %}{{ d }}'
+    loops += '{% endfor %}{% endfor %}{% endfor %}{% endfor %}'
+    rows = [[[list(range(4))] * 4] * 4] * 4
+    return Case('deep_nesting', source + loops, {'v0': 'x', 'rows': rows}, ['v0', 'rows.0.0.0.1'])
+
+
+def wide_loop():
+    source = (
+        '<table>{% for item in items %}<tr><td>{{ forloop.counter }}</td>'
+        '<td>{{ item.title }}</td><td>{{ item.price }}</td><td>{{ item.tags.0 }}</td>'
+        '</tr>\n{% endfor %}</table>'
+    )
+    items = [Item(n) for n in range(5000)]
+    return Case('wide_loop', source, {'items': items}, ['items.0.title', 'items.10.tags.0'])
+
+
+def many_vars():
+    count = 2000
+    source = '\n'.join('<b>{{ v%d }}</b> {{ obj.a%d|default:"-" }}' % (n, n % 50) for n in range(count))
+    data = {'v%d' % n: n for n in range(count)}
+    data['obj'] = {'a%d' % n: 'value %d' % n for n in range(25)}
+    return Case('many_vars', source, data, ['v1', 'v1999', 'obj.a3', 'obj.a30|default:"-"'])
+
+
+def context_churn():
+    source = (
+        '{% for row in rows %}{% with b=row.title c=row.price %}'
+        '{% for tag in row.tags %}{% with t=tag %}{{ b }}{{ c }}{{ t }}{% endwith %}'
+        '{% endfor %}{% endwith %}{% endfor %}'
+    )
+    rows = [Item(n) for n in range(2000)]
+    return Case('context_churn', source, {'rows': rows}, ['rows.0.price'])
+
+
+def nested_table():
+    # Output from deep in the tree, which once was joined again at every level
+    source = (
+        '<table>{% for row in rows %}<tr>{% with first=row.0 %}'
+        '{% for cell in row %}<td>{{ first }}:{{ cell }}</td>{% endfor %}'
+        '{% endwith %}</tr>\n{% endfor %}</table>'
+    )
+    rows = [[r * 10 + c for c in range(10)] for r in range(200)]
+    return Case('nested_table', source, {'rows': rows}, ['rows.5.3'])
+
+
+CASES = [large_text, deep_nesting, wide_loop, many_vars, context_churn, nested_table]
+
+
+def best(func, repeat):
+    '''Best time for one call of ``func``, in seconds.'''
+    number, _ = timeit.Timer(func).autorange()
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def peak(func):
+    '''Peak memory allocated while calling ``func``, in bytes.'''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(case, repeat):
+    source = case.source
+    template = Template(source)
+    compiled = Template(source, compiled=True)
+    context = Context(case.data)
+    expressions = [FilterExpression(path) for path in case.paths]
+
+    def resolve():
+        for expr in expressions:
+            expr.resolve(context)
+
+    return {
+        'tokenise': best(lambda: sum(1 for _ in tokenise(source)), repeat),
+        'parse': best(lambda: parse(Source(source)), repeat),
+        'load': best(lambda: Template(source), repeat),
+        'render': best(lambda: template.render(Context(case.data)), repeat),
+        'render_compiled': best(lambda: compiled.render(Context(case.data)), repeat),
+        'resolve': best(resolve, repeat),
+        'load_peak': peak(lambda: Template(source)),
+        'render_peak': peak(lambda: template.render(Context(case.data))),
+    }
+
+
+def run(args):
+    results = {}
+    for factory in CASES:
+        case = factory()
+        if args.only and args.only not in case.name:
+            continue
+        figures = measure(case, args.repeat)
+        for key, value in sorted(figures.items()):
+            results['%s.%s' % (case.name, key)] = value
+            print('%-32s %s' % ('%s.%s' % (case.name, key), format_value(key, value)))
+        sys.stdout.flush()
+    data = {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(data, fout, indent=1, sort_keys=True)
+
+
+def format_value(key, value):
+    if key.endswith('_peak'):
+        return '%10.1f KB' % (value / 1024.0)
+    return '%10.3f us' % (value * 1e6)
+
+
+def compare(args):
+    with open(args.old) as fin:
+        old = json.load(fin)['results']
+    with open(args.new) as fin:
+        new = json.load(fin)['results']
+    regressions = 0
+    for key in sorted(set(old) & set(new)):
+        if not old[key]:
+            continue
+        change = new[key] / old[key] - 1
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -args.threshold:
+            flag = '  improved'
+        print('%-32s %s -> %s %+7.1f%%%s' % (
+            key, format_value(key, old[key]), format_value(key, new[key]), change * 100, flag,
+        ))
+    for key in sorted(set(old) ^ set(new)):
+        print('%-32s only in %s' % (key, args.old if key in old else args.new))
+    print('%d regression(s) over %.0f%%' % (regressions, args.threshold * 100))
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-o', '--output', help='write results to this JSON file')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('-k', '--only', help='only run cases with this in their name')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two sets of results')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
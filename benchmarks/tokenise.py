@@ -0,0 +1,67 @@
+'''
+Tokeniser throughput benchmark.
+
+    python -m benchmarks.tokenise
+
+Compares tokenise() against the original tokeniser, which yielded no
+positions, on multi-megabyte templates of differing tag density.
+'''
+
+import timeit
+
+from contemplation.base import tag_re, tokenise
+
+def original_tokenise(template):
+    '''The tokeniser before offsets were added, less verbatim handling.'''
+    upto = 0
+    for m in tag_re.finditer(template):
+        start, end = m.span()
+        if upto < start:
+            yield (0, template[upto:start])
+        upto = end
+        tag, var, comment = m.groups()
+        if tag is not None:
+            yield (2, tag)
+        elif var is not None:
+            yield (1, var)
+        else:
+            yield (3, comment)
+    if upto < len(template):
+        yield (0, template[upto:])
+
+
+SAMPLES = {
+    # Mostly markup, as in large email templates
+    'text': (
+        '<tr><td class="cell">Some static text for the body of the email'
+        ' which runs on for a while</td></tr>\n'
+        '<p>{{ user.name }}</p>\n'
+    ),
+    # Dense tags
+    'tags': (
+        '{% for x in y %}<li>{{ x.a }}</li>{# note #}{{ x.b }}{% endfor %}\n'
+    ),
+    # Inline CSS and scripts have plenty of bare braces
+    'braces': (
+        '<style>td { color: red; } p { margin: 0 }</style>\n'
+        '<script>if (a) { b({c: 1}); }</script>{{ value }}\n'
+    ),
+}
+
+
+def main(size=4 * 1024 * 1024, repeat=3):
+    for name, chunk in sorted(SAMPLES.items()):
+        source = chunk * (size // len(chunk))
+        megabytes = len(source) / 1024.0 / 1024.0
+        print('%s: %.1f MB, %d tokens' % (
+            name, megabytes, sum(1 for _ in tokenise(source)),
+        ))
+        for label, func in (('original', original_tokenise), ('tokenise', tokenise)):
+            best = min(timeit.repeat(
+                lambda: sum(1 for _ in func(source)), number=1, repeat=repeat,
+            ))
+            print('  %-9s %7.1f MB/s' % (label, megabytes / best))
+
+
+if __name__ == '__main__':
+    main()
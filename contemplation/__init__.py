@@ -1,3 +1,11 @@
 
-from .base import Template, TemplateSyntaxError, VariableDoesNotExist
-from .context import Context
+from .base import (
+    Template, TemplateSyntaxError, VariableDoesNotExist, TemplateDoesNotExist,
+)
+from .context import Context, Lazy, impure
+from .loader import Loader
+from .bytecode import BytecodeCache
+from .columns import render_rows, stream_rows
+from .pool import render_many
+from .profiler import Profiler
+from .safestring import SafeString, mark_safe
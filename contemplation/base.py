@@ -6,15 +6,25 @@ Major differences:
 - allows line breaks in tags
 - unified tag syntax
 
-TODO:
-- filters as chains of partials
+Filters are resolved when parsed, and each {{ x|a|b:c }} composed into a
+chain of closures (see FilterExpression).
 '''
 
+from .context import MISSING, SLOTS, UNBOUND, claim_slots, slot_for
+from .safestring import conditional_escape, mark_safe
 from .utils import smart_split, unescape_string_literal
 
-import ast
+from functools import wraps
+from inspect import isawaitable
+from sys import intern
+import asyncio
 import re
 
+try:
+    unicode
+except NameError: # Py3
+    unicode = str
+
 tag_re = re.compile(r'{%\s*(?P<tag>.+?)\s*%}|{{\s*(?P<var>.+?)\s*}}|{#\s*(?P<comment>.+?)\s*#}')
 
 TOKEN_TEXT = 0
@@ -30,6 +40,11 @@ TOKEN_MAPPING = {
 
 TAGS = {}
 FILTERS = {}
+# Names of the filters registered as pure
+PURE_FILTERS = set()
+
+# Text nodes up to this long are interned
+INTERN_LENGTH = 64
 
 class TemplateSyntaxError(Exception):
     pass
@@ -37,79 +52,358 @@ class TemplateSyntaxError(Exception):
 class VariableDoesNotExist(Exception):
     pass
 
+class TemplateDoesNotExist(Exception):
+    pass
+
 class Template(object):
-    def __init__(self, source):
+    '''
+    A parsed template.
+
+    If ``compiled`` is set, the node tree is also lowered into a single Python
+    function, which is used for rendering.
+
+    ``loader`` is used to find the templates this one extends and includes.
+    The names and source hashes of those are kept in ``dependencies``.
+
+    Variables are HTML escaped unless ``autoescape`` is False, or they're
+    in an {% autoescape off %} block.
+    '''
+    def __init__(self, source, name=None, compiled=False, loader=None, autoescape=True):
         self.source = source
+        self.name = name
+        self.autoescape = autoescape
+        self.dependencies = {}
         self.root = parse(self)
+        optimise(self.root.nodelist)
+        include(self, loader)
+        inherit(self, loader)
+        self.names = referenced_names(self.root.nodelist)
+        if compiled:
+            self.func = compile_nodelist(self.root.nodelist, name or '<template>')
+        else:
+            self.func = None
 
     def render(self, context):
+        context.clear_memo()
+        if self.func is not None:
+            return self.func(context)
         return self.root.nodelist.render(context)
 
+    async def render_async(self, context):
+        '''
+        Render the template, awaiting any awaitable values.
+
+        Awaitables in the context under names the template uses are gathered
+        concurrently before rendering starts.  Those found later, as
+        attributes or returned from calls, are awaited where they're reached.
+        Always renders from the node tree.
+        '''
+        context.clear_memo()
+        pending = {}
+        for name in self.names:
+            try:
+                value = context[name]
+            except KeyError:
+                continue
+            if isawaitable(value):
+                pending[name] = value
+        if pending:
+            values = await asyncio.gather(*pending.values())
+            context.push(zip(pending, values))
+        try:
+            out = []
+            await self.root.nodelist.render_async(context, out)
+        finally:
+            if pending:
+                context.pop()
+        return ''.join(out)
+
+    def stream(self, context):
+        '''
+        Render the template, yielding chunks of output as they're produced.
+        '''
+        context.clear_memo()
+        return self.root.nodelist.stream(context)
+
+    def render_to(self, context, write, buffer_size=8192):
+        '''
+        Render the template, passing output to ``write`` as it's produced.
+
+        Small chunks are gathered until at least ``buffer_size`` characters
+        are waiting, to save on calls to ``write``.
+        '''
+        pending = []
+        size = 0
+        for chunk in self.stream(context):
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= buffer_size:
+                write(''.join(pending))
+                pending = []
+                size = 0
+        if pending:
+            write(''.join(pending))
+
+    def __reduce__(self):
+        state = self.__dict__.copy()
+        if self.func is not None:
+            state['func'] = dump_function(self.func)
+        # Slot indices are baked into nodes and compiled code, so try to get
+        # the same ones in the process that loads us.
+        return (_new_template, (dict(SLOTS),), state)
+
+    def __setstate__(self, state):
+        if state['func'] is not None:
+            if self.__dict__.pop('slots_moved', False):
+                # Nodes have taken new slots, so the code is out of date
+                state['func'] = compile_nodelist(state['root'].nodelist, state['name'] or '<template>')
+            else:
+                state['func'] = load_function(state['func'])
+        self.__dict__.update(state)
+
+def _new_template(slots):
+    template = Template.__new__(Template)
+    template.slots_moved = not claim_slots(slots)
+    return template
+
 
 def tokenise(template):
-    '''A generator which yields (type, content) pairs'''
+    '''
+    A generator which yields (type, content, offset) tuples, where offset is
+    where the token starts in the source.  See ``position``.
+    '''
     upto = 0
-    for m in tag_re.finditer(template):
+    matches = tag_re.finditer(template)
+    for m in matches:
         start, end = m.span()
         if upto < start:
-            yield (TOKEN_TEXT, template[upto:start])
+            yield (TOKEN_TEXT, template[upto:start], upto)
         upto = end
         tag, var, comment = m.groups()
-        if tag is not None:
-            yield (TOKEN_BLOCK, tag)
+        if var is not None:
+            yield (TOKEN_VAR, var, start)
+        elif comment is not None:
+            yield (TOKEN_COMMENT, comment, start)
+        else:
+            yield (TOKEN_BLOCK, tag, start)
             # If it was a verbatim tag, scan to the end and yield as a Text node
             if tag[:9] in ('verbatim', 'verbatim '):
                 marker = 'end%s' % tag
-                while 1:
-                    m = stream.next()
+                for m in matches:
                     if m.group('tag') == marker:
                         break
-                yield (TOKEN_TEXT, template[upto:m.start()])
-                yield (TOKEN_BLOCK, m.group('tag'))
+                else:
+                    raise TemplateSyntaxError(
+                        'Unclosed %r tag on line %d' % (tag, position(template, start)[0])
+                    )
+                yield (TOKEN_TEXT, template[upto:m.start()], upto)
+                yield (TOKEN_BLOCK, marker, m.start())
                 upto = m.end()
-            # XXX Handle verbatim tag and translations
-        elif var is not None:
-            yield (TOKEN_VAR, var)
-        else:
-            yield (TOKEN_COMMENT, comment)
+            # XXX Handle translations
     if upto < len(template):
-        yield (TOKEN_TEXT, template[upto:])
+        yield (TOKEN_TEXT, template[upto:], upto)
+
+def position(source, offset):
+    '''
+    Return the (line, col) of an offset into source.  Lines count from 1,
+    columns from 0.
+    '''
+    line = source.count('\n', 0, offset) + 1
+    col = offset - source.rfind('\n', 0, offset) - 1
+    return line, col
+
+def referenced_names(nodelist):
+    '''
+    Return the set of names looked up in the context by a Nodelist and its
+    children.
+    '''
+    names = set()
+    for node in nodelist:
+        for var in node.variables():
+            if var.bits is not None:
+                names.add(var.bits[0])
+        for name in node.child_nodelists:
+            names.update(referenced_names(getattr(node, name)))
+    return frozenset(names)
 
 class Nodelist(list):
     '''A list that can render as a node.'''
+    __slots__ = ()
+
     def render(self, context):
-        return ''.join(
-            node.render(context)
-            for node in self
-        )
+        out = []
+        self.render_into(context, out)
+        return ''.join(out)
+
+    def render_into(self, context, out):
+        for node in self:
+            node.render_into(context, out)
+
+    def stream(self, context):
+        for node in self:
+            yield from node.stream(context)
+
+    async def render_async(self, context, out):
+        for node in self:
+            await node.render_async(context, out)
+
+    def collapse(self):
+        '''
+        If there's only one node, have render_into call it directly instead
+        of looping.  The list must not be changed afterwards.
+        '''
+        self.__class__ = SingleNodelist if len(self) == 1 else Nodelist
+
+class SingleNodelist(Nodelist):
+    '''A collapsed Nodelist of one node.'''
+    __slots__ = ()
+
+    def render_into(self, context, out):
+        self[0].render_into(context, out)
+
+def set_state(obj, state):
+    '''
+    Restore pickled state to an object with __slots__, where it comes as
+    (__dict__ or None, slot values).
+    '''
+    if isinstance(state, tuple):
+        dict_state, state = state
+        if dict_state:
+            obj.__dict__.update(dict_state)
+    if state:
+        for name, value in state.items():
+            setattr(obj, name, value)
 
 class Node(object):
+    __slots__ = ('nodelist', 'origin')
     close_tag = None
+    # Set to True or False to control escaping of variables inside this node
+    autoescape = None
+    # Tags which start a new section within this one, as "empty" in "for"
+    branch_tags = ()
     raw_token = False
+    # Names of attributes holding Nodelists of children.  'nodelist', which
+    # the parser fills, is added for any node with a close_tag.
+    child_nodelists = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(Node, cls).__init_subclass__(**kwargs)
+        if cls.close_tag is not None and 'nodelist' not in cls.child_nodelists:
+            cls.child_nodelists = ('nodelist',) + tuple(cls.child_nodelists)
+
     def __init__(self):
-        self.nodelist = Nodelist()
+        # (template name, line, label) of the tag this node was parsed from
+        self.origin = None
+        for name in self.child_nodelists:
+            setattr(self, name, Nodelist())
+
+    def __setstate__(self, state):
+        set_state(self, state)
+
+    def branch(self, tag_name, bits):
+        '''
+        Called when one of branch_tags is found.  Returns the Nodelist to put
+        the following nodes in.
+        '''
+        raise TemplateSyntaxError('%r does not accept {%% %s %%}' % (type(self).__name__, tag_name))
+
+    # Subclasses must override at least one of render and render_into.
+    def render(self, context):
+        out = []
+        self.render_into(context, out)
+        return ''.join(out)
+
+    def render_into(self, context, out):
+        '''
+        Append rendered output to the list ``out``, which is shared by the
+        whole render.  Block nodes should override this to pass ``out`` on
+        to their nodelist.
+        '''
+        out.append(self.render(context))
+
+    def stream(self, context):
+        '''
+        Yield chunks of rendered output.  Block nodes should override this to
+        stream their nodelist.
+        '''
+        yield self.render(context)
+
+    async def render_async(self, context, out):
+        '''
+        As render_into, but awaiting awaitable values.  Nodes which resolve
+        Variables or have children should override this.
+        '''
+        self.render_into(context, out)
+
+    def variables(self):
+        '''Return the Variables this node resolves.'''
+        return ()
+
+    def compile(self, compiler):
+        '''
+        Emit code to render this node.  Falls back to calling render_into.
+        '''
+        compiler.write('%s(context, out)' % compiler.const(self.render_into))
 
 class VarNode(Node):
-    def __init__(self, token):
+    __slots__ = ('token', 'display')
+
+    def __init__(self, token, autoescape=True):
         # XXX Expression
         super(VarNode, self).__init__()
-        self.token = Variable(token)
+        self.token = FilterExpression(token)
+        # Decided now, so rendering never checks
+        if autoescape:
+            self.display = conditional_escape
+        else:
+            self.display = unicode
 
     def render(self, context):
         try:
             value = self.token.resolve(context)
         except VariableDoesNotExist:
             value = context.invalid
-        return unicode(value)
+        return self.display(value)
+
+    async def render_async(self, context, out):
+        try:
+            value = await self.token.resolve_async(context)
+        except VariableDoesNotExist:
+            value = context.invalid
+        out.append(self.display(value))
+
+    def variables(self):
+        return self.token.variables()
+
+    def compile(self, compiler):
+        if self.token.literal is not None:
+            compiler.write('append(%r)' % unicode(self.display(self.token.literal)))
+            return
+        with compiler.block('try:'):
+            compiler.write('value = %s.resolve(context)' % compiler.const(self.token))
+        with compiler.block('except %s:' % compiler.const(VariableDoesNotExist)):
+            compiler.write('value = context.invalid')
+        compiler.write('append(%s(value))' % compiler.const(self.display))
 
 class TextNode(Node):
+    __slots__ = ('content',)
+
     def __init__(self, content):
         super(TextNode, self).__init__()
+        # Short runs of markup repeat a lot, so share them
+        if len(content) <= INTERN_LENGTH:
+            content = intern(content)
         self.content = content
 
     def render(self, context):
         return self.content
 
+    def render_into(self, context, out):
+        out.append(self.content)
+
+    def compile(self, compiler):
+        compiler.write('append(%r)' % self.content)
+
 var_re = re.compile(r'''
     ^(?:
     (?P<int>\d+)|
@@ -118,15 +412,116 @@ var_re = re.compile(r'''
     (?P<string>"[^"\\]*(?:\\.[^"\\]*)*"|'[^'\\]*(?:\\.[^'\\]*)*')
     )$
 ''', re.VERBOSE)
+# Lookup strategies for a (type, segment) pair.  ITEM tries the full chain of
+# item, attribute then index lookup.  ATTR and INDEX are only used where the
+# type means the earlier steps must fail, so the result is the same.
+ITEM, ATTR, INDEX = range(3)
+LOOKUP_STRATEGY = {}
+# Types made at runtime would grow the cache without end (and be kept alive
+# by it), so it's emptied when it reaches this size.
+LOOKUP_STRATEGY_SIZE = 4096
+
+def lookup_strategy(cls, bit):
+    try:
+        return LOOKUP_STRATEGY[cls, bit]
+    except KeyError:
+        pass
+    if not hasattr(cls, '__getitem__'):
+        strategy = ATTR
+    elif cls in (list, tuple, str):
+        # Indexing with a str is always a TypeError
+        strategy = INDEX if bit.isdigit() else ATTR
+    else:
+        strategy = ITEM
+    if len(LOOKUP_STRATEGY) >= LOOKUP_STRATEGY_SIZE:
+        LOOKUP_STRATEGY.clear()
+    LOOKUP_STRATEGY[cls, bit] = strategy
+    return strategy
+
+def lookup(current, bit):
+    '''
+    Look up one segment of a dotted path.
+    '''
+    strategy = LOOKUP_STRATEGY.get((type(current), bit))
+    if strategy is None:
+        strategy = lookup_strategy(type(current), bit)
+    try:
+        if strategy is ATTR:
+            return getattr(current, bit)
+        if strategy is INDEX:
+            return current[int(bit)]
+        try:
+            return current[bit]
+        except (TypeError, AttributeError, KeyError, ValueError):
+            pass
+        try:
+            return getattr(current, bit)
+        except (TypeError, AttributeError):
+            pass
+        return current[int(bit)]
+    except (IndexError, ValueError, KeyError, TypeError, AttributeError):
+        raise VariableDoesNotExist(
+            "Failed lookup for [%r] in %r" % (bit, current)
+        )
+
+def call(func, owner, name, context):
+    '''
+    Call a callable found while resolving a Variable.
+
+    If the context has a ``memo``, the result is kept there under the
+    identity of ``owner`` (the object it was found on, or the callable
+    itself) and ``name``, for the rest of the render.  Callables marked
+    with ``impure``, and those returning awaitables, are always called.
+    '''
+    memo = getattr(context, 'memo', None)
+    if memo is None:
+        return func()
+    key = (id(owner), name)
+    entry = memo.get(key)
+    # Holding owner keeps its id from being reused during the render
+    if entry is not None and entry[0] is owner:
+        return entry[1]
+    value = func()
+    if not getattr(func, 'impure', False) and not isawaitable(value):
+        memo[key] = (owner, value)
+    return value
+
+def evaluate(value, owner, name, context):
+    '''
+    Call ``value`` if it's callable, as found on ``owner`` under ``name``.
+    Returns MISSING if it can't be called without arguments.
+    '''
+    if callable(value):
+        try:
+            return call(value, owner, name, context)
+        except TypeError:
+            return MISSING
+    return value
+
+def step(current, bit, context):
+    '''
+    Resolve one segment of a Variable's path: look ``bit`` up on
+    ``current``, then call the result if it's callable.  Callables found
+    on the context itself are memoised under their own identity.
+    '''
+    value = lookup(current, bit)
+    return evaluate(value, value if current is context else current, bit, context)
+
 class Variable(object):
     '''
     Wrapper to hold a variable from parsing, awaiting resolution at
     render time.
     '''
+    __slots__ = ('raw', 'literal', 'variable', 'bits', 'slot', 'tail')
+
     def __init__(self, raw):
         self.raw = raw
         self.literal = None
         self.variable = None
+        self.bits = None
+        # If the first name is bound by a tag, its slot and the rest of the path
+        self.slot = None
+        self.tail = None
 
         match = var_re.match(raw)
         if not match:
@@ -142,34 +537,75 @@ class Variable(object):
         elif string:
             self.literal = unescape_string_literal(string)
         elif var:
-            self.variable = var
+            self.raw = self.variable = intern(var)
+            self.bits = tuple(map(intern, var.split('.')))
+            self.slot = SLOTS.get(self.bits[0])
+            self.tail = self.bits[1:]
+
+    def __setstate__(self, state):
+        set_state(self, state)
+        if self.slot is not None:
+            self.slot = slot_for(self.bits[0])
 
     def resolve(self, context):
         if self.literal is not None:
             return self.literal
         # dotted lookup
-        bits = self.variable.split('.')
         current = context
+        bits = self.bits
         try: # catch for silent failure
+            if self.slot is not None:
+                try:
+                    value = context.slots[self.slot]
+                except (AttributeError, IndexError):
+                    value = MISSING
+                if value is UNBOUND:
+                    return context.invalid
+                if value is not MISSING:
+                    current = evaluate(value, value, None, context)
+                    if current is MISSING:
+                        return context.invalid
+                    bits = self.tail
             for bit in bits:
-                try: # dict lookup
-                    current = current[bit]
-                except (TypeError, AttributeError, KeyError, ValueError):
-                    try: # attr lookup
-                        # Add check for base level
-                        current = getattr(current, bit)
-                    except (TypeError, AttributeError):
-                        try: # list lookup
-                            current = current[int(bit)]
-                        except (IndexError, ValueError, KeyError, TypeError):
-                            raise VariableDoesNotExist(
-                                "Failed lookup for [%r] in %r" % (bit, current)
-                            )
-                if callable(current):
-                    try:
-                        current = current()
-                    except TypeError:
+                current = step(current, bit, context)
+                if current is MISSING:
+                    return context.invalid
+        except Exception as e:
+            if getattr(e, 'silent_variable_failure', False):
+                current = context.invalid
+            else:
+                raise
+        return current
+
+    async def resolve_async(self, context):
+        '''
+        As resolve, but awaiting any awaitable found along the path.
+        '''
+        if self.literal is not None:
+            return self.literal
+        current = context
+        bits = self.bits
+        try:
+            if self.slot is not None:
+                try:
+                    value = context.slots[self.slot]
+                except (AttributeError, IndexError):
+                    value = MISSING
+                if value is UNBOUND:
+                    return context.invalid
+                if value is not MISSING:
+                    current = evaluate(value, value, None, context)
+                    if current is MISSING:
                         return context.invalid
+                    if isawaitable(current):
+                        current = await current
+                    bits = self.tail
+            for bit in bits:
+                current = step(current, bit, context)
+                if current is MISSING:
+                    return context.invalid
+                if isawaitable(current):
+                    current = await current
         except Exception as e:
             if getattr(e, 'silent_variable_failure', False):
                 current = context.invalid
@@ -178,64 +614,173 @@ class Variable(object):
         return current
 
 
+constant_string = r'"[^"\\]*(?:\\.[^"\\]*)*"|\'[^\'\\]*(?:\\.[^\'\\]*)*\''
+filter_re = re.compile(r'''
+    ^(?P<var>%(constant)s|[^\s|:"']+)|
+    \s*\|\s*(?P<name>\w+)(?::(?P<arg>%(constant)s|[^\s|:"']+))?
+''' % {'constant': constant_string}, re.VERBOSE)
+
 class FilterExpression(object):
     '''
     Parse a variable followed by an optional list of filters and their
     arguments.
+
+    Filters are looked up when parsed, and literal arguments resolved, so
+    the whole expression becomes one ``resolve`` callable: a chain of
+    closures, each applying one filter to the result of the last.
+
+    If the value and all arguments are literals, and all the filters are
+    pure, the result is worked out now and kept as ``literal``.
     '''
+    __slots__ = ('token', 'filters', 'filter_names', 'var', 'literal', 'variable', 'resolve')
+
     def __init__(self, token):
         self.token = token
-        self.variable = None
-        self.constant = None
-        self.filters = None
-
-        code = ast.parse(token, mode='eval')
-
-        if isinstance(code.body, ast.Name):
-            self.variable = code.body.id
-        elif isinstance(code.body, ast.Str):
-            self.constant = code.body.s
-        elif isinstance(code.body, ast.Num):
-            self.constant = code.body.n
-        elif isinstance(code.body, ast.BinOp) and isinstance(code.body.op, ast.BitOr):
-            self.filters = self._resolve_binops(code.body)
+        filters = []
+        filter_names = []
+        upto = 0
+        for match in filter_re.finditer(token):
+            if match.start() != upto:
+                raise TemplateSyntaxError('Could not parse the remainder: %r from %r' % (token[upto:], token))
+            upto = match.end()
+            var, name, arg = match.groups()
+            if var is not None:
+                self.var = Variable(var)
+                continue
+            if match.start() == 0:
+                raise TemplateSyntaxError('Could not parse the variable before the filters in %r' % token)
+            try:
+                func = FILTERS[name]
+            except KeyError:
+                raise TemplateSyntaxError('Invalid filter: %r' % name)
+            if arg is not None:
+                arg = Variable(arg)
+                if arg.literal is not None:
+                    arg = safe_literal(arg.literal)
+            filters.append((func, arg))
+            filter_names.append(name)
+        if upto != len(token):
+            raise TemplateSyntaxError('Could not parse the remainder: %r from %r' % (token[upto:], token))
+        # Most have no filters, so share the empty tuple
+        self.filters = tuple(filters)
+        self.filter_names = tuple(filter_names)
+        if not filters:
+            self.token = self.var.raw
+
+        self.literal = safe_literal(self.var.literal)
+        if self.filters:
+            self.literal = self.fold()
+            self.variable = None
+        else:
+            self.variable = self.var.variable
+        self.bind()
 
-    def _resolve_binops(self, node):
+    def fold(self):
         '''
-        Translate Python AST into what we want it to mean.
-        - BinOp(BitOr) become calls
-
-        Expression(body=BinOp(
-            left=BinOp(
-                left=BinOp(
-                    left=Name(id='a', ctx=Load()),
-                    op=BitOr(),
-                    right=Name(id='b', ctx=Load())
-                ),
-                op=BitOr(),
-                right=Name(id='c', ctx=Load())
-            ),
-            op=BitOr(),
-            right=Name(id='d', ctx=Load())
-        ))
-
-        Would become:
-        Expression(body=Call(
-            func=Name(id='d', ctx=Load()), args=[
-                Call(func=Name(id='c', ctx=Load()), args=[
-                    Call(func=Name(id='b', ctx=Load()), args=[
-                        Name(id='a', ctx=Load()),
-                    ], keywords=[], starargs=None, kwargs=None),
-                ], keywords=[], starargs=None, kwargs=None),
-            ], keywords=[], starargs=None, kwargs=None)
-        )
+        Apply the filters to a literal value, if they're all pure and have
+        literal arguments.  Returns the result, or None if it can't be done.
         '''
-        # right is always "simple"
-        # left could be compound OR
-        if isinstance(node.left, ast.BinOp) and isinstance(node.left.op, ast.BitOr):
-            filters.append(self._resolve_binops(node.left))
+        if self.literal is None:
+            return None
+        for name, (func, arg) in zip(self.filter_names, self.filters):
+            if name not in PURE_FILTERS or isinstance(arg, Variable):
+                return None
+        try:
+            value = self.compose()(None)
+        except Exception:
+            # Leave it to fail when rendered
+            return None
+        if value is not None:
+            self.filters = ()
+            self.filter_names = ()
+        return value
+
+    def bind(self):
+        if self.literal is not None:
+            self.resolve = self.resolve_literal
+        elif self.filters:
+            self.resolve = self.compose()
         else:
-            pass
+            self.resolve = self.var.resolve
+
+    def resolve_literal(self, context):
+        return self.literal
+
+    def compose(self):
+        var = self.var
+        if var.literal is not None:
+            value = safe_literal(var.literal)
+            def func(context):
+                return value
+        else:
+            def func(context):
+                try:
+                    return var.resolve(context)
+                except VariableDoesNotExist:
+                    return context.invalid
+        for filter_func, arg in self.filters:
+            func = apply_filter(func, filter_func, arg)
+        return func
+
+    async def resolve_async(self, context):
+        if self.literal is not None:
+            return self.literal
+        if not self.filters:
+            return await self.var.resolve_async(context)
+        if self.var.literal is not None:
+            value = safe_literal(self.var.literal)
+        else:
+            try:
+                value = await self.var.resolve_async(context)
+            except VariableDoesNotExist:
+                value = context.invalid
+        for filter_func, arg in self.filters:
+            if arg is None:
+                value = filter_func(value)
+            elif isinstance(arg, Variable):
+                value = filter_func(value, await arg.resolve_async(context))
+            else:
+                value = filter_func(value, arg)
+        return value
+
+    def variables(self):
+        '''Return the Variables this expression resolves.'''
+        return [self.var] + [arg for func, arg in self.filters if isinstance(arg, Variable)]
+
+    def __getstate__(self):
+        # Closures can't be pickled, so filters go by name and the chain is
+        # rebuilt on load.
+        state = {name: getattr(self, name) for name in self.__slots__ if name != 'resolve'}
+        state['filters'] = tuple(arg for func, arg in self.filters)
+        return state
+
+    def __setstate__(self, state):
+        state['filters'] = tuple(
+            (FILTERS[name], arg)
+            for name, arg in zip(state['filter_names'], state['filters'])
+        )
+        set_state(self, state)
+        self.bind()
+
+def safe_literal(value):
+    '''Literal strings are safe from escaping.'''
+    if isinstance(value, unicode):
+        return mark_safe(value)
+    return value
+
+def apply_filter(inner, filter_func, arg):
+    '''Return a callable applying a filter to the result of ``inner``.'''
+    if arg is None:
+        def func(context):
+            return filter_func(inner(context))
+    elif isinstance(arg, Variable):
+        resolve = arg.resolve
+        def func(context):
+            return filter_func(inner(context), resolve(context))
+    else:
+        def func(context):
+            return filter_func(inner(context), arg)
+    return func
 
 kwarg_re = re.compile(r"(?:(\w+)=)?(.+)")
 
@@ -255,12 +800,13 @@ def parse_bits(bits):
         # If there was a foo= part, end args parsing
         if m.group(1):
             break
-        val = Variable(m.group(2))
+        val = FilterExpression(m.group(2))
         # See if it's a constant we can resolve now
-        try:
-            val = val.resolve({})
-        except VariableDoesNotExist:
-            pass
+        if val.literal is not None:
+            # Without filters, the plain literal: names given to include and
+            # extends end up in code objects, and marshal won't take a
+            # SafeString
+            val = val.literal if val.token != val.var.raw else val.var.literal
         args.append(val)
         del bits[:1]
 
@@ -272,46 +818,73 @@ def parse_bits(bits):
         key, val = m.groups()
         if key in kwargs:
             raise TemplateSyntaxError("Duplicate keyword values passed: %s" % key)
-        val = Variable(val)
-        #try:
-        #    val = val.resolve({})
-        #except VariableDoesNotExist:
-        #    pass
-        kwargs[key] = val
+        kwargs[key] = FilterExpression(val)
         del bits[:1]
 
     return args, kwargs, varname
 
 def parse(tmpl):
     stream = tokenise(tmpl.source)
+    root = Node()
+    root.nodelist = Nodelist()
     stack = [
-        Node()
+        root
+    ]
+    # The Nodelist each open node is currently filling
+    targets = [
+        root.nodelist
     ]
 
-    for mode, tok in stream:
+    source = tmpl.source
+    line = 1
+    upto = 0
+
+    for mode, tok, offset in stream:
         if mode == TOKEN_TEXT:
-            stack[-1].nodelist.append(TextNode(tok))
+            targets[-1].append(TextNode(tok))
 
         elif mode == TOKEN_VAR:
-            stack[-1].nodelist.append(VarNode(tok))
+            for node in reversed(stack):
+                if node.autoescape is not None:
+                    autoescape = node.autoescape
+                    break
+            else:
+                autoescape = tmpl.autoescape
+            line += source.count('\n', upto, offset)
+            upto = offset
+            node = VarNode(tok, autoescape)
+            node.origin = (tmpl.name, line, intern('{{ %s }}' % tok))
+            targets[-1].append(node)
 
         elif mode == TOKEN_BLOCK:
+            line += source.count('\n', upto, offset)
+            upto = offset
             bits = smart_split(tok)
             tag_name = bits.pop(0)
             # Does this match the close tag name of the current Top of Stack?
             if tag_name == stack[-1].close_tag:
                 stack.pop()
+                targets.pop()
+                continue
+            # Or does it start another section of it?
+            if tag_name in stack[-1].branch_tags:
+                targets[-1] = stack[-1].branch(tag_name, bits)
                 continue
-            tag_class = TAGS[tag_name]
+            try:
+                tag_class = TAGS[tag_name]
+            except KeyError:
+                raise TemplateSyntaxError('Unknown tag %r on line %d' % (tag_name, line))
             if tag_class.raw_token:
                 tag = tag_class(tok)
             else:
                 # Parse bits for args, kwargs
                 args, kwargs, varname = parse_bits(bits)
                 tag = tag_class(*args, **kwargs)
-            stack[-1].nodelist.append(tag)
+            tag.origin = (tmpl.name, line, intern('{%% %s %%}' % tag_name))
+            targets[-1].append(tag)
             if tag_class.close_tag:
                 stack.append(tag)
+                targets.append(tag.nodelist)
 
     assert len(stack) == 1, "Unbalanced block nodes: %r" % stack
     return stack[0]
@@ -324,12 +897,48 @@ class Registry(object):
         if tag_class is None:
             return _register_tag
         else:
-            return _registre_tag(tag_class)
+            return _register_tag(tag_class)
+
+    def filter(self, name, filter_func=None, is_safe=False, pure=False):
+        '''
+        Register a filter, taking the value and an optional argument.  If
+        ``is_safe``, a safe value stays marked safe after filtering.
 
-    def filter(self, name, filter_func):
-        FILTERS[name] = filter_func
+        Mark filters ``pure`` if their result depends only on their
+        arguments, with no side effects.  They're applied to literals when
+        the template is loaded.
+        '''
+        def _register_filter(filter_func):
+            if is_safe:
+                func = keep_safe(filter_func)
+            else:
+                func = filter_func
+            FILTERS[name] = func
+            if pure:
+                PURE_FILTERS.add(name)
+            else:
+                PURE_FILTERS.discard(name)
+            return filter_func
+        if filter_func is None:
+            return _register_filter
+        else:
+            return _register_filter(filter_func)
+
+def keep_safe(filter_func):
+    @wraps(filter_func)
+    def wrapper(value, *args):
+        result = filter_func(value, *args)
+        # Only strings: a safe number would act as a non-empty string
+        if hasattr(value, '__html__') and isinstance(result, unicode):
+            return mark_safe(result)
+        return result
+    return wrapper
 
 register = Registry()
 
+from .compiler import compile_nodelist, dump_function, load_function
+from .optimise import optimise
+from .loadertags import include, inherit
 from . import defaulttags
-#from . import defaultfilters
+from . import cache
+from . import defaultfilters
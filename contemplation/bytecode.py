@@ -0,0 +1,74 @@
+
+'''
+Persistent on-disk cache of parsed (and compiled) templates.
+
+    loader = Loader(['templates/'], bytecode_cache=BytecodeCache('/var/cache/tmpl'))
+
+Entries are keyed on a hash of the template source, so a fresh process can
+skip tokenising and parsing for any template it has seen before.  The node
+tree is pickled; compiled render functions are stored as marshalled code.
+
+The cache directory must only be writable by trusted users, as entries are
+unpickled on load.
+'''
+
+from hashlib import sha1
+import os
+import pickle
+import sys
+import tempfile
+
+# Bump this when the node tree or compiler output changes shape.
+CACHE_VERSION = 7
+
+MAGIC = ('contemplation-%d-%s\n' % (
+    CACHE_VERSION, sys.implementation.cache_tag,
+)).encode('ascii')
+
+
+class BytecodeCache(object):
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, source, name=None, compiled=False, autoescape=True):
+        '''Build the cache key for a template.'''
+        digest = sha1(MAGIC)
+        digest.update(('%s\n%s\n%s\n' % (name, compiled, autoescape)).encode('utf-8'))
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.cache')
+
+    def load(self, key):
+        '''
+        Return the Template stored under ``key``, or None if it's missing or
+        was written by another engine or Python version.
+        '''
+        try:
+            with open(self.path(key), 'rb') as fin:
+                if fin.readline() != MAGIC:
+                    return None
+                return pickle.load(fin)
+        except (IOError, OSError, EOFError, ValueError, AttributeError,
+                ImportError, pickle.UnpicklingError):
+            return None
+
+    def dump(self, key, template):
+        # Write to a temporary file first so readers never see half an entry.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(MAGIC)
+                pickle.dump(template, fout, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                os.unlink(os.path.join(self.directory, name))
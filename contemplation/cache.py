@@ -0,0 +1,192 @@
+
+'''
+Fragment caching.
+
+    {% cache 300 "sidebar" user.id %}...{% endcache %}
+
+The rendered body is stored under the fragment name and the values of any
+following variables, for the given number of seconds (or until evicted,
+if the timeout is None).  Add ``using="name"`` to pick a backend from
+``caches``:
+
+    caches['shared'] = FileCache('/var/cache/fragments')
+
+LocalCache keeps fragments in this process.  FileCache keeps them in a
+directory, so they're shared by every process using it.
+'''
+
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+import io
+import os
+import tempfile
+import time
+
+from .base import (
+    register, Node, FilterExpression, TemplateSyntaxError, VariableDoesNotExist, unicode,
+)
+
+
+class LocalCache(object):
+    '''
+    In-process LRU cache, holding at most ``max_size`` characters of
+    fragments.
+    '''
+    def __init__(self, max_size=2 ** 20):
+        self.max_size = max_size
+        self.size = 0
+        self.data = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                expires, value = self.data[key]
+            except KeyError:
+                return None
+            if expires is not None and expires < time.time():
+                self.delete(key)
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = None if timeout is None else time.time() + timeout
+        with self.lock:
+            if key in self.data:
+                self.delete(key)
+            if len(value) > self.max_size:
+                return
+            self.data[key] = (expires, value)
+            self.size += len(value)
+            while self.size > self.max_size:
+                self.delete(next(iter(self.data)))
+
+    def delete(self, key):
+        expires, value = self.data.pop(key)
+        self.size -= len(value)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+
+
+class FileCache(object):
+    '''
+    Keeps each fragment in a file in ``directory``, with its expiry time on
+    the first line.  Writes are atomic, so any number of processes may
+    share the directory.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, sha1(key.encode('utf-8')).hexdigest() + '.fragment')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with io.open(path, encoding='utf-8', newline='') as fin:
+                expires = fin.readline()
+                if expires != '\n' and float(expires) < time.time():
+                    os.unlink(path)
+                    return None
+                return fin.read()
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, value, timeout=None):
+        expires = '' if timeout is None else repr(time.time() + timeout)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with io.open(fd, 'w', encoding='utf-8', newline='') as fout:
+                fout.write(expires + '\n')
+                fout.write(value)
+            os.replace(tmp, self.path(key))
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.fragment'):
+                os.unlink(os.path.join(self.directory, name))
+
+
+caches = {
+    'default': LocalCache(),
+}
+
+
+@register.tag('cache')
+class CacheNode(Node):
+    __slots__ = ('timeout', 'fragment_name', 'vary_on', 'using')
+    close_tag = 'endcache'
+    child_nodelists = ('nodelist',)
+    def __init__(self, timeout, fragment_name, *vary_on, **kwargs):
+        super(CacheNode, self).__init__()
+        using = kwargs.pop('using', None)
+        if kwargs:
+            raise TemplateSyntaxError("'cache' tag got unexpected arguments: %s" % ', '.join(kwargs))
+        if not isinstance(timeout, FilterExpression):
+            timeout = float(timeout)
+        if isinstance(using, FilterExpression) and using.literal is not None:
+            using = using.literal
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.using = using or 'default'
+
+    def resolve(self, value, context):
+        if isinstance(value, FilterExpression):
+            try:
+                return value.resolve(context)
+            except VariableDoesNotExist:
+                return None
+        return value
+
+    def lookup(self, context):
+        '''
+        Return the backend, key and any cached value for this render.
+        '''
+        backend = caches[self.resolve(self.using, context)]
+        digest = sha1()
+        for var in self.vary_on:
+            digest.update(unicode(self.resolve(var, context)).encode('utf-8'))
+            digest.update(b'\0')
+        key = 'template.cache.%s.%s' % (self.resolve(self.fragment_name, context), digest.hexdigest())
+        return backend, key, backend.get(key)
+
+    def store(self, context, backend, key, value):
+        timeout = self.resolve(self.timeout, context)
+        if timeout is not None:
+            timeout = float(timeout)
+        backend.set(key, value, timeout)
+
+    def render_into(self, context, out):
+        backend, key, value = self.lookup(context)
+        if value is None:
+            value = self.nodelist.render(context)
+            self.store(context, backend, key, value)
+        out.append(value)
+
+    async def render_async(self, context, out):
+        backend, key, value = self.lookup(context)
+        if value is None:
+            body = []
+            await self.nodelist.render_async(context, body)
+            value = ''.join(body)
+            self.store(context, backend, key, value)
+        out.append(value)
+
+    def variables(self):
+        return [
+            var
+            for expr in (self.timeout, self.fragment_name, self.using) + self.vary_on
+            if isinstance(expr, FilterExpression)
+            for var in expr.variables()
+        ]
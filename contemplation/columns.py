@@ -0,0 +1,217 @@
+
+'''
+Render one template over many rows of columnar data.
+
+    render_rows(template, {
+        'user.name': names,
+        'user.email': emails,
+        'total': totals,
+    })
+
+Each column is a sequence (a list, a NumPy array...) of values for a
+variable path, all of the same length.  A {{ }} tag is worked out for a
+whole column at once: the path is found once, then any remaining lookups
+and filters are applied along the column.  The rows are then built by
+interleaving those columns with the static text between them.
+
+A path is taken from the longest column key it starts with, so with a
+'user' column of objects, {{ user.name }} looks up ``name`` on each of them.
+
+Any other tags are rendered for each row as usual, with a Context built
+from that row's values.
+'''
+
+from itertools import islice
+
+from .base import TextNode, VarNode, Variable, VariableDoesNotExist, lookup, safe_literal
+from .context import BUILTINS, MISSING, Context
+
+
+def render_rows(template, columns, invalid=''):
+    '''
+    Render ``template`` for each row of ``columns`` (a dict of sequences
+    keyed by variable path), returning a list of the outputs.
+    '''
+    count = row_count(columns)
+    return RowPlan(template).render(columns, 0, count, invalid)
+
+
+def stream_rows(template, columns, invalid='', batch_size=10000):
+    '''
+    As render_rows, but yields the outputs as they're produced.  Columns
+    are worked out ``batch_size`` rows at a time, so the whole output is
+    never held at once.
+    '''
+    count = row_count(columns)
+    plan = RowPlan(template)
+    for start in range(0, count, batch_size):
+        for output in plan.render(columns, start, min(start + batch_size, count), invalid):
+            yield output
+
+
+def row_count(columns):
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError('Columns must all be the same length')
+    return lengths.pop() if lengths else 0
+
+
+class RowPlan(object):
+    '''
+    The top level nodes of a template, with the static text between them
+    pre-joined into a format string.
+    '''
+    def __init__(self, template):
+        text = []
+        self.nodes = []
+        for node in template.root.nodelist:
+            if type(node) is TextNode:
+                text.append(node.content.replace('%', '%%'))
+            elif type(node) is VarNode and node.token.literal is not None:
+                text.append(node.display(node.token.literal).replace('%', '%%'))
+            else:
+                text.append('%s')
+                self.nodes.append(node)
+        self.format = ''.join(text)
+
+    def render(self, columns, start, stop, invalid):
+        if start >= stop:
+            return []
+        if not self.nodes:
+            return [self.format.replace('%%', '%')] * (stop - start)
+        batch = Batch(columns, start, stop, invalid)
+        outputs = [batch.render(node) for node in self.nodes]
+        fmt = self.format
+        return [fmt % row for row in zip(*outputs)]
+
+
+class Batch(object):
+    '''
+    A range of rows being rendered.
+    '''
+    def __init__(self, columns, start, stop, invalid):
+        self.columns = columns
+        self.start = start
+        self.stop = stop
+        self.count = stop - start
+        self.invalid = invalid
+        self.contexts = None
+
+    def column(self, key):
+        column = self.columns[key]
+        if self.start == 0 and self.stop == len(column):
+            return column
+        try:
+            return column[self.start:self.stop]
+        except TypeError:
+            return list(islice(column, self.start, self.stop))
+
+    def render(self, node):
+        '''Return the output of ``node`` for each row.'''
+        if type(node) is VarNode:
+            return list(map(node.display, self.resolve(node.token)))
+        if self.contexts is None:
+            self.contexts = row_contexts(self.columns, self.start, self.stop, self.invalid)
+        return [node.render(context) for context in self.contexts]
+
+    def resolve(self, expr):
+        '''
+        Return the value of a FilterExpression for each row, as VarNode
+        would render it.
+        '''
+        var = expr.var
+        if var.literal is not None:
+            values = [safe_literal(var.literal)] * self.count
+        else:
+            values = [
+                self.invalid if value is MISSING else value
+                for value in self.lookup(var)
+            ]
+        for func, arg in expr.filters:
+            if arg is None:
+                values = [value if value is MISSING else func(value) for value in values]
+            elif isinstance(arg, Variable):
+                values = [
+                    MISSING if value is MISSING or arg_value is MISSING else func(value, arg_value)
+                    for value, arg_value in zip(values, self.lookup(arg))
+                ]
+            else:
+                values = [value if value is MISSING else func(value, arg) for value in values]
+        # A filter argument that couldn't be found fails the whole tag
+        return [self.invalid if value is MISSING else value for value in values]
+
+    def lookup(self, var):
+        '''
+        Return the value of a Variable for each row, or MISSING where it
+        couldn't be found.
+        '''
+        if var.literal is not None:
+            return [var.literal] * self.count
+        bits = var.bits
+        for end in range(len(bits), 0, -1):
+            key = '.'.join(bits[:end])
+            if key in self.columns:
+                return [
+                    follow(value, bits[end:], self.invalid)
+                    for value in self.column(key)
+                ]
+        if bits[0] in BUILTINS:
+            value = follow(BUILTINS[bits[0]], bits[1:], self.invalid)
+            return [value] * self.count
+        return [MISSING] * self.count
+
+
+def follow(value, tail, invalid):
+    '''
+    Resolve the rest of a dotted path from ``value``, calling callables as
+    Variable.resolve does.
+    '''
+    try:
+        if callable(value):
+            try:
+                value = value()
+            except TypeError:
+                return invalid
+        for bit in tail:
+            value = lookup(value, bit)
+            if callable(value):
+                try:
+                    value = value()
+                except TypeError:
+                    return invalid
+    except VariableDoesNotExist:
+        return MISSING
+    except Exception as e:
+        if getattr(e, 'silent_variable_failure', False):
+            return invalid
+        raise
+    return value
+
+
+class RowDict(dict):
+    '''A dict made to hold the values under a dotted prefix.'''
+
+
+def row_contexts(columns, start, stop, invalid):
+    '''
+    Build a Context for each row, nesting dotted keys into dicts.
+    '''
+    contexts = []
+    keys = sorted(columns, key=lambda key: key.count('.'))
+    values = [islice(columns[key], start, stop) for key in keys]
+    paths = [key.split('.') for key in keys]
+    for row in zip(*values):
+        data = RowDict()
+        for path, value in zip(paths, row):
+            target = data
+            for bit in path[:-1]:
+                if bit not in target:
+                    target[bit] = RowDict()
+                target = target[bit]
+                if type(target) is not RowDict:
+                    # Given as a whole value, which we mustn't change
+                    break
+            else:
+                target[path[-1]] = value
+        contexts.append(Context(data, invalid=invalid))
+    return contexts
@@ -0,0 +1,116 @@
+
+'''
+Lower a parsed node tree into a single Python function.
+
+Each node is asked to emit source for itself through its ``compile`` method.
+The default (see ``Node.compile``) calls back into the node's ``render``, so
+any tag works in a compiled template - only the hot ones need to know how to
+write code.
+'''
+
+from contextlib import contextmanager
+from types import FunctionType
+import marshal
+
+# Indent level beyond which nodes aren't compiled inline.  CPython allows 20
+# nested blocks, and each tag may open a couple.
+MAX_DEPTH = 12
+
+
+class Compiler(object):
+    '''
+    Accumulates the body of the generated ``render(context)`` function.
+
+    Within the generated code ``context`` is the render context and ``append``
+    adds a string to the output.
+    '''
+    def __init__(self):
+        self.lines = []
+        self.depth = 1
+        self.namespace = {}
+        self._consts = {}
+        self._counter = 0
+
+    def local(self, prefix='_v'):
+        '''Return a fresh local variable name.'''
+        self._counter += 1
+        return '%s%d' % (prefix, self._counter)
+
+    def const(self, value):
+        '''Make ``value`` visible to the generated code, returning its name.'''
+        try:
+            return self._consts[id(value)][0]
+        except KeyError:
+            pass
+        name = self.local('_c')
+        # Keep a reference so the id can not be recycled while we compile.
+        self._consts[id(value)] = (name, value)
+        self.namespace[name] = value
+        return name
+
+    def write(self, line):
+        self.lines.append('    ' * self.depth + line)
+
+    @contextmanager
+    def block(self, line):
+        '''Write a compound statement header, and indent the lines within.'''
+        self.write(line)
+        self.depth += 1
+        mark = len(self.lines)
+        yield
+        if len(self.lines) == mark:
+            self.write('pass')
+        self.depth -= 1
+
+    def nodelist(self, nodelist):
+        for node in nodelist:
+            if self.depth > MAX_DEPTH:
+                # Python only allows blocks to nest so deep, so let nodes
+                # below here render themselves.
+                self.write('%s(context, out)' % self.const(node.render_into))
+            else:
+                node.compile(self)
+
+    def source(self):
+        return '\n'.join(
+            [
+                'def render(context):',
+                '    out = []',
+                '    append = out.append',
+            ] + self.lines + [
+                "    return ''.join(out)",
+                '',
+            ]
+        )
+
+
+def compile_nodelist(nodelist, filename='<template>'):
+    '''
+    Compile a Nodelist into a function taking a Context and returning the
+    rendered string.
+    '''
+    compiler = Compiler()
+    compiler.nodelist(nodelist)
+    code = compile(compiler.source(), filename, 'exec')
+    namespace = dict(compiler.namespace)
+    exec(code, namespace)
+    return namespace['render']
+
+
+def dump_function(func):
+    '''
+    Reduce a compiled render function to picklable parts: the marshalled code
+    and the constants it refers to.
+    '''
+    namespace = dict(func.__globals__)
+    namespace.pop('__builtins__', None)
+    del namespace['render']
+    return marshal.dumps(func.__code__), namespace
+
+
+def load_function(data):
+    '''Rebuild a render function from the output of dump_function.'''
+    code, namespace = data
+    namespace = dict(namespace)
+    namespace['render'] = FunctionType(marshal.loads(code), namespace, 'render')
+    return namespace['render']
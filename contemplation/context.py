@@ -1,16 +1,119 @@
 
 try:
-    from collections import ChainMap
-except ImportError: # Py < 3
-    from chainmap import ChainMap
+    from collections.abc import MutableMapping
+except ImportError: # Py < 3.3
+    from collections import MutableMapping
+from threading import Lock
 
 BUILTINS = {'True': True, 'False': False, 'None': None}
 
+# Names bound by tags (for loop targets, with keys) are given a fixed slot
+# index when the tag is parsed.  The values live in Context.slots, so binding
+# and looking them up is list indexing instead of a walk over the maps.
+#
+# The table is shared by every template in the process, so nodes spliced in
+# from other templates by include and extends agree on the indices.  It
+# grows by one for each distinct name, not each template, and a Context only
+# holds as many slots as the tags it renders need (see bind_slots).
+SLOTS = {}
+# The name for each slot index
+SLOT_NAMES = []
+MISSING = object()
+# A name bound by a tag, but given no value (a for loop unpacking too few).
+# It hides any value for the name in the maps.
+UNBOUND = object()
+_slots_lock = Lock()
+# Guards the Lazy counters
+_lazy_lock = Lock()
+
+def slot_for(name):
+    '''Return the slot index for a name bound by a tag.'''
+    try:
+        return SLOTS[name]
+    except KeyError:
+        pass
+    with _slots_lock:
+        if name not in SLOTS:
+            SLOTS[name] = len(SLOT_NAMES)
+            SLOT_NAMES.append(name)
+        return SLOTS[name]
+
+def claim_slots(table):
+    '''
+    Give names the slot indices they had in ``table`` (a copy of SLOTS from
+    another process), where they're still free.  Returns False if any name
+    ends up with a different index.
+    '''
+    with _slots_lock:
+        for name, index in sorted(table.items(), key=lambda item: item[1]):
+            if name not in SLOTS and index == len(SLOT_NAMES):
+                SLOTS[name] = index
+                SLOT_NAMES.append(name)
+        return all(SLOTS.get(name) == index for name, index in table.items())
+
+class Lazy(object):
+    '''
+    A context value worked out when it's first looked up, then kept.
+
+        Context({'orders': Lazy(lambda: list(user.orders.all()))})
+
+    ``func`` is called with no arguments, the first time the value is
+    resolved.  It shouldn't be async: put awaitables in the context as they
+    are.
+
+    The value is kept for the life of the Lazy, not reset between renders,
+    so make a new one (with the Context) for each render.  Two threads
+    resolving it at once may both call ``func``.
+
+    ``created`` and ``evaluated`` count Lazy values over the process, so
+    the difference is how many were never used.  For a single render, see
+    Context.untouched.
+    '''
+    __slots__ = ('func', 'value')
+    created = 0
+    evaluated = 0
+
+    def __init__(self, func):
+        self.func = func
+        self.value = MISSING
+        with _lazy_lock:
+            Lazy.created += 1
+
+    # Variable.resolve calls callables, so that's how we're evaluated
+    def __call__(self):
+        if self.value is MISSING:
+            self.value = self.func()
+            self.func = None
+            with _lazy_lock:
+                Lazy.evaluated += 1
+        return self.value
+
+    @property
+    def is_evaluated(self):
+        return self.value is not MISSING
+
+    def __repr__(self):
+        if self.value is MISSING:
+            return '<Lazy %r>' % (self.func,)
+        return '<Lazy = %r>' % (self.value,)
+
+def impure(func):
+    '''
+    Mark a method as giving a different result each call, so a memoising
+    Context won't keep its result.
+    '''
+    func.impure = True
+    return func
+
 class ContextDict(dict):
+    '''
+    A level of the Context stack, which pops itself when used as a context
+    manager.
+    '''
     def __init__(self, context, *args, **kwargs):
-        super(ContextDict, self).__init__(*args, **kwargs)
-        context.maps.insert(0, self)
+        dict.__init__(self, *args, **kwargs)
         self.context = context
+        context.maps.append(self)
 
     def __enter__(self):
         return self
@@ -18,16 +121,118 @@ class ContextDict(dict):
     def __exit__(self, *args, **kwargs):
         self.context.pop()
 
-class Context(ChainMap):
-    def __init__(self, default=None, invalid=''):
+class Context(MutableMapping):
+    '''
+    A stack of mappings.  maps[0] is the data passed in, maps[1] a copy of
+    BUILTINS, and each push() adds a ContextDict to the end.  Lookups search
+    from the end; writes go to the last map.
+
+    Values for names bound by tags are kept in ``slots`` (see slot_for), and
+    shadow any in the maps.
+
+    If ``memoise`` is set, callables met in dotted lookups are called once
+    per object and name, with the results kept in ``memo`` (see
+    base.call).  Each render starts with an empty memo (see clear_memo),
+    so a Context can be reused after the objects in it change.
+    '''
+    def __init__(self, default=None, invalid='', memoise=False):
         self.invalid = invalid
-        super(Context, self).__init__(dict(BUILTINS), default or {})
+        self.memo = {} if memoise else None
+        self.slots = []
+        self.maps = [{} if default is None else default]
+        self.push(BUILTINS)
+
+    def clear_memo(self):
+        '''
+        Forget the results memoised so far.  Called at the start of each
+        render.
+        '''
+        if self.memo is not None:
+            self.memo = {}
+
+    def bind_slots(self, size):
+        '''
+        Return the slots list, grown to hold at least ``size`` slots.
+        '''
+        slots = self.slots
+        if len(slots) < size:
+            slots.extend([MISSING] * (size - len(slots)))
+        return slots
+
+    def __getitem__(self, key):
+        index = SLOTS.get(key)
+        if index is not None and index < len(self.slots):
+            value = self.slots[index]
+            if value is UNBOUND:
+                raise KeyError(key)
+            if value is not MISSING:
+                return value
+        for mapping in reversed(self.maps):
+            if key in mapping:
+                return mapping[key]
+        # Let the data's __missing__ have a go, as for a defaultdict
+        return self.maps[0][key]
+
+    def __contains__(self, key):
+        index = SLOTS.get(key)
+        if index is not None and index < len(self.slots):
+            value = self.slots[index]
+            if value is UNBOUND:
+                return False
+            if value is not MISSING:
+                return True
+        for mapping in reversed(self.maps):
+            if key in mapping:
+                return True
+        return False
+
+    def __setitem__(self, key, value):
+        self.maps[-1][key] = value
+
+    def __delitem__(self, key):
+        del self.maps[-1][key]
+
+    def flatten(self):
+        '''
+        Return a dict of all the values visible in the context, including
+        names bound by tags.  It's built afresh each time, as the data passed
+        in may have changed.
+        '''
+        flat = {}
+        for mapping in self.maps:
+            flat.update(mapping)
+        for index, value in enumerate(self.slots):
+            if value is UNBOUND:
+                flat.pop(SLOT_NAMES[index], None)
+            elif value is not MISSING:
+                flat[SLOT_NAMES[index]] = value
+        return flat
+
+    def __iter__(self):
+        return iter(self.flatten())
+
+    def __len__(self):
+        return len(self.flatten())
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(map(repr, self.maps)))
+
+    def untouched(self):
+        '''
+        Return the names of Lazy values in the context which haven't been
+        evaluated: after a render, those the template never used.
+        '''
+        return sorted({
+            key
+            for mapping in self.maps
+            for key, value in mapping.items()
+            if isinstance(value, Lazy) and not value.is_evaluated
+        })
 
     def push(self, *args, **kwargs):
         return ContextDict(self, *args, **kwargs)
 
     def pop(self):
-        if len(self.maps) < 2:
-            raise IndexError
-        return self.maps.pop(0)
-
+        if len(self.maps) < 3:
+            raise IndexError('pop from empty Context')
+        return self.maps.pop()
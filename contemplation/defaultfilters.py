@@ -0,0 +1,142 @@
+
+'''
+Default filters.
+
+All of these are pure, so are applied to literals at load time.
+'''
+
+import re
+
+from .base import register, unicode
+from .safestring import escape as escape_html, mark_safe
+
+
+@register.filter('add', pure=True)
+def add(value, arg):
+    try:
+        return int(value) + int(arg)
+    except (ValueError, TypeError):
+        try:
+            return value + arg
+        except Exception:
+            return ''
+
+
+@register.filter('capfirst', is_safe=True, pure=True)
+def capfirst(value):
+    value = unicode(value)
+    return value and value[0].upper() + value[1:]
+
+
+@register.filter('cut', pure=True)
+def cut(value, arg):
+    return unicode(value).replace(arg, '')
+
+
+@register.filter('default', pure=True)
+def default(value, arg):
+    return value or arg
+
+
+@register.filter('default_if_none', pure=True)
+def default_if_none(value, arg):
+    if value is None:
+        return arg
+    return value
+
+
+@register.filter('escape', pure=True)
+def escape(value):
+    return escape_html(value)
+
+
+@register.filter('first', pure=True)
+def first(value):
+    try:
+        return value[0]
+    except (IndexError, KeyError, TypeError):
+        return ''
+
+
+@register.filter('join', pure=True)
+def join(value, arg):
+    try:
+        return arg.join(map(unicode, value))
+    except TypeError:
+        return value
+
+
+@register.filter('last', pure=True)
+def last(value):
+    try:
+        return value[-1]
+    except (IndexError, KeyError, TypeError):
+        return ''
+
+
+@register.filter('length', is_safe=True, pure=True)
+def length(value):
+    try:
+        return len(value)
+    except (ValueError, TypeError):
+        return 0
+
+
+@register.filter('lower', pure=True)
+def lower(value):
+    return unicode(value).lower()
+
+
+@register.filter('removetags', is_safe=True, pure=True)
+def removetags(value, tags):
+    tags = '|'.join(re.escape(tag) for tag in tags.split())
+    return re.sub(r'</?(?:%s)(?:/?>|\s[^>]*>)' % tags, '', unicode(value))
+
+
+@register.filter('safe', pure=True)
+def safe(value):
+    return mark_safe(unicode(value))
+
+
+@register.filter('striptags', is_safe=True, pure=True)
+def striptags(value):
+    return re.sub(r'<[^>]*?>', '', unicode(value))
+
+
+@register.filter('title', is_safe=True, pure=True)
+def title(value):
+    return unicode(value).title()
+
+
+@register.filter('truncatewords', is_safe=True, pure=True)
+def truncatewords(value, arg):
+    try:
+        length = int(arg)
+    except ValueError:
+        return value
+    words = unicode(value).split()
+    if len(words) > length:
+        words = words[:length] + ['...']
+    return ' '.join(words)
+
+
+@register.filter('upper', pure=True)
+def upper(value):
+    return unicode(value).upper()
+
+
+@register.filter('wordcount', pure=True)
+def wordcount(value):
+    return len(unicode(value).split())
+
+
+@register.filter('yesno', pure=True)
+def yesno(value, arg='yes,no,maybe'):
+    bits = arg.split(',')
+    if len(bits) < 2:
+        return value
+    if len(bits) == 2:
+        bits.append(bits[1])
+    if value is None:
+        return bits[2]
+    return bits[0] if value else bits[1]
@@ -1,12 +1,49 @@
 
-from .base import register, Node, Variable, TemplateSyntaxError
+from .base import (
+    register, Node, FilterExpression, TemplateSyntaxError, VariableDoesNotExist,
+)
+from .context import MISSING, UNBOUND, slot_for
 from .utils import smart_split
 
 from datetime import datetime
-from itertools import cycle
+import asyncio
+from itertools import chain, cycle, repeat
 import re
 
-# XXX class AutoEscapeControlNode(Node):
+FILL = repeat(UNBOUND)
+
+@register.tag('autoescape')
+class AutoEscapeControlNode(Node):
+    '''
+    {% autoescape off %}...{% endautoescape %}
+
+    Applied to the variables within as they're parsed.  Templates pulled
+    in by {% include %} or {% extends %} are parsed on their own, so their
+    variables keep the escaping they were loaded with.
+    '''
+    __slots__ = ('autoescape',)
+    close_tag = 'endautoescape'
+    child_nodelists = ('nodelist',)
+    raw_token = True
+    def __init__(self, token):
+        super(AutoEscapeControlNode, self).__init__()
+        bits = token.split()
+        if len(bits) != 2 or bits[1] not in ('on', 'off'):
+            raise TemplateSyntaxError("'autoescape' argument should be 'on' or 'off'")
+        self.autoescape = bits[1] == 'on'
+
+    def render_into(self, context, out):
+        self.nodelist.render_into(context, out)
+
+    def stream(self, context):
+        return self.nodelist.stream(context)
+
+    async def render_async(self, context, out):
+        await self.nodelist.render_async(context, out)
+
+    def compile(self, compiler):
+        compiler.nodelist(self.nodelist)
+
 # XXX class CommentNode(Node):
 # XXX class CsrfTokenNode(Node):
 # XXX class CycleNode(Node):
@@ -14,14 +51,53 @@ import re
 # XXX class FilterNode(Node):
 # XXX class FirstOfNode(Node):
 
+class ForLoop(object):
+    '''
+    The "forloop" value within a for tag.
+    '''
+    __slots__ = ('counter0', 'length', 'last', 'parentloop')
+
+    def __init__(self, length, parentloop):
+        self.counter0 = 0
+        self.length = length
+        self.last = False
+        self.parentloop = parentloop
+
+    @property
+    def counter(self):
+        return self.counter0 + 1
+
+    @property
+    def first(self):
+        return self.counter0 == 0
+
+    # These need the length, so are missing when looping over an iterator.
+    @property
+    def revcounter(self):
+        if self.length is None:
+            raise AttributeError('revcounter')
+        return self.length - self.counter0
+
+    @property
+    def revcounter0(self):
+        if self.length is None:
+            raise AttributeError('revcounter0')
+        return self.length - self.counter0 - 1
+
 @register.tag('for')
 class ForNode(Node):
     '''
     Repeating loop.
 
-    {% for a, x, c in iterable %}.... {% endfor %}
+    {% for a, x, c in iterable %}.... {% empty %}...{% endfor %}
+
+    Items are fetched one ahead, to know when we're on the last, so iterators
+    are not consumed any sooner than needed.
     '''
+    __slots__ = ('nodelist_empty', 'is_reversed', 'source', 'args', 'slots', 'loop_slot', 'size')
     close_tag = 'endfor'
+    branch_tags = ('empty',)
+    child_nodelists = ('nodelist', 'nodelist_empty')
     raw_token = True
     def __init__(self, token):
         super(ForNode, self).__init__()
@@ -35,7 +111,7 @@ class ForNode(Node):
         if self.is_reversed:
             bits.pop()
 
-        source = Variable(bits.pop())
+        source = FilterExpression(bits.pop())
         if bits.pop() != 'in':
             raise TemplateSyntaxError("'for' statement should use the format 'for x in y': %s" % token)
 
@@ -44,24 +120,181 @@ class ForNode(Node):
             if not var or ' ' in var:
                 raise TemplateSyntaxError("'for' tag received an invalid argument: %s" % token)
 
+        self.source = source
         self.args = loop_vars
+        self.take_slots()
 
-    def render(self, context):
-        source = self.source.resolve(context)
-        if self.is_reversed():
+    def __setstate__(self, state):
+        super(ForNode, self).__setstate__(state)
+        self.take_slots()
+
+    def take_slots(self):
+        self.slots = [slot_for(var) for var in self.args]
+        self.loop_slot = slot_for('forloop')
+        # How long context.slots must be for us to bind them
+        self.size = max(self.slots + [self.loop_slot]) + 1
+
+    def branch(self, tag_name, bits):
+        return self.nodelist_empty
+
+    def get_source(self, context):
+        '''Resolve the source, returning (iterable, length or None).'''
+        try:
+            source = self.source.resolve(context)
+        except VariableDoesNotExist:
+            return (), 0
+        return self.prepare(source)
+
+    def prepare(self, source):
+        if source is None:
+            return (), 0
+        try:
+            length = len(source)
+        except TypeError:
+            length = None
+        if self.is_reversed:
+            if length is None:
+                source = list(source)
+                length = len(source)
             source = reversed(source)
-        output = []
-        unpack = len(self.args) > 1
-        with context.push():
-            for values in source:
-                if unpack:
-                    context.maps[0][self.args[0]] = values
-                else:
-                    context.maps[0].update(
-                        zip(self.args, values)
-                    )
-                output.append(self.nodelist.render(context))
-        return ''.join(output)
+        return source, length
+
+    def iterate(self, context):
+        '''
+        Bind the loop variables to each item in turn, yielding the ForLoop.
+        '''
+        source, length = self.get_source(context)
+        return self.loop(context, iter(source), length)
+
+    def loop(self, context, items, length):
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+
+        slots = context.bind_slots(self.size)
+        saved = [slots[index] for index in self.slots]
+        parentloop = slots[self.loop_slot]
+        loop = ForLoop(length, None if parentloop is MISSING else parentloop)
+        slots[self.loop_slot] = loop
+        try:
+            if len(self.slots) == 1:
+                index = self.slots[0]
+                for following in items:
+                    slots[index] = item
+                    yield loop
+                    loop.counter0 += 1
+                    item = following
+                slots[index] = item
+                loop.last = True
+                yield loop
+            else:
+                for following in items:
+                    self.unpack(slots, item)
+                    yield loop
+                    loop.counter0 += 1
+                    item = following
+                self.unpack(slots, item)
+                loop.last = True
+                yield loop
+        finally:
+            for index, value in zip(self.slots, saved):
+                slots[index] = value
+            slots[self.loop_slot] = parentloop
+
+    async def aloop(self, context, items):
+        '''
+        As loop, for an async iterator.  The length is never known.
+        '''
+        try:
+            item = await items.__anext__()
+        except StopAsyncIteration:
+            return
+
+        slots = context.bind_slots(self.size)
+        saved = [slots[index] for index in self.slots]
+        parentloop = slots[self.loop_slot]
+        loop = ForLoop(None, None if parentloop is MISSING else parentloop)
+        slots[self.loop_slot] = loop
+        try:
+            while True:
+                try:
+                    following = await items.__anext__()
+                except StopAsyncIteration:
+                    break
+                self.unpack(slots, item)
+                yield loop
+                loop.counter0 += 1
+                item = following
+            self.unpack(slots, item)
+            loop.last = True
+            yield loop
+        finally:
+            for index, value in zip(self.slots, saved):
+                slots[index] = value
+            slots[self.loop_slot] = parentloop
+
+    def unpack(self, slots, values):
+        if len(self.slots) == 1:
+            slots[self.slots[0]] = values
+            return
+        # Unset any names there are too few values for
+        try:
+            for index, value in zip(self.slots, chain(values, FILL)):
+                slots[index] = value
+        except TypeError:
+            for index in self.slots:
+                slots[index] = UNBOUND
+
+    def render_into(self, context, out):
+        render_into = self.nodelist.render_into
+        loop = None
+        for loop in self.iterate(context):
+            render_into(context, out)
+        if loop is None:
+            self.nodelist_empty.render_into(context, out)
+
+    def stream(self, context):
+        loop = None
+        for loop in self.iterate(context):
+            yield from self.nodelist.stream(context)
+        if loop is None:
+            yield from self.nodelist_empty.stream(context)
+
+    async def render_async(self, context, out):
+        try:
+            source = await self.source.resolve_async(context)
+        except VariableDoesNotExist:
+            source = None
+        loop = None
+        if hasattr(source, '__aiter__') and not self.is_reversed:
+            loops = self.aloop(context, source.__aiter__())
+            try:
+                async for loop in loops:
+                    await self.nodelist.render_async(context, out)
+            finally:
+                # Restore the slots now, not when it's collected
+                await loops.aclose()
+        else:
+            if hasattr(source, '__aiter__'):
+                source = [item async for item in source]
+            source, length = self.prepare(source)
+            for loop in self.loop(context, iter(source), length):
+                await self.nodelist.render_async(context, out)
+        if loop is None:
+            await self.nodelist_empty.render_async(context, out)
+
+    def variables(self):
+        return self.source.variables()
+
+    def compile(self, compiler):
+        loop = compiler.local('_loop')
+        compiler.write('%s = None' % loop)
+        with compiler.block('for %s in %s(context):' % (loop, compiler.const(self.iterate))):
+            compiler.nodelist(self.nodelist)
+        if self.nodelist_empty:
+            with compiler.block('if %s is None:' % loop):
+                compiler.nodelist(self.nodelist_empty)
 
 # XXX class IfChangedNode(Node):
 # XXX class IfEqualNode(Node):
@@ -73,7 +306,9 @@ class ForNode(Node):
 
 @register.tag('now')
 class NowNode(Node):
+    __slots__ = ('format_string',)
     def __init__(self, format_string):
+        super(NowNode, self).__init__()
         self.format_string = format_string
 
     def render(self, context):
@@ -82,24 +317,119 @@ class NowNode(Node):
 # XXX class SpacelessNode(Node):
 # XXX class TemplateTagNode(Node):
 # XXX class URLNode(Node):
-# XXX class VerbatimNode(Node):
+
+@register.tag('verbatim')
+class VerbatimNode(Node):
+    '''
+    Output the contents without parsing.  The tokeniser passes everything up
+    to the matching end tag as a single text token.
+
+    {% verbatim %}{{ not_a_var }}{% endverbatim %}
+    '''
+    __slots__ = ()
+    close_tag = 'endverbatim'
+    child_nodelists = ('nodelist',)
+    raw_token = True
+    def __init__(self, token):
+        super(VerbatimNode, self).__init__()
+
+    def render_into(self, context, out):
+        self.nodelist.render_into(context, out)
+
+    def stream(self, context):
+        return self.nodelist.stream(context)
+
+    def compile(self, compiler):
+        compiler.nodelist(self.nodelist)
+
 # XXX class WidthRatioNode(Node):
 # XXX class WithNode(Node):
 
 @register.tag('with')
 class WithNode(Node):
+    __slots__ = ('names', 'kwargs', 'size')
     close_tag = 'endwith'
+    child_nodelists = ('nodelist',)
     def __init__(self, **kwargs):
         super(WithNode, self).__init__()
-        self.kwargs = kwargs
+        self.names = sorted(kwargs, key=slot_for)
+        self.kwargs = [(slot_for(key), kwargs[key]) for key in self.names]
+        self.size = max([index + 1 for index, val in self.kwargs] or [0])
 
-    def render(self, context):
-        new_data = {
-            key: val.resolve(context)
-            for key, val in self.kwargs.items()
-        }
-        with context.push(**new_data):
-            return self.nodelist.render(context)
+    def __setstate__(self, state):
+        super(WithNode, self).__setstate__(state)
+        self.kwargs = [
+            (slot_for(key), val)
+            for key, (index, val) in zip(self.names, self.kwargs)
+        ]
+        self.size = max([index + 1 for index, val in self.kwargs] or [0])
+
+    def render_into(self, context, out):
+        new_data = [
+            (index, val.resolve(context))
+            for index, val in self.kwargs
+        ]
+        slots = context.bind_slots(self.size)
+        saved = [(index, slots[index]) for index, val in self.kwargs]
+        try:
+            for index, value in new_data:
+                slots[index] = value
+            self.nodelist.render_into(context, out)
+        finally:
+            for index, value in saved:
+                slots[index] = value
+
+    def stream(self, context):
+        new_data = [
+            (index, val.resolve(context))
+            for index, val in self.kwargs
+        ]
+        slots = context.bind_slots(self.size)
+        saved = [(index, slots[index]) for index, val in self.kwargs]
+        try:
+            for index, value in new_data:
+                slots[index] = value
+            yield from self.nodelist.stream(context)
+        finally:
+            for index, value in saved:
+                slots[index] = value
+
+    async def render_async(self, context, out):
+        values = await asyncio.gather(*[
+            val.resolve_async(context)
+            for index, val in self.kwargs
+        ])
+        slots = context.bind_slots(self.size)
+        saved = [(index, slots[index]) for index, val in self.kwargs]
+        try:
+            for (index, val), value in zip(self.kwargs, values):
+                slots[index] = value
+            await self.nodelist.render_async(context, out)
+        finally:
+            for index, value in saved:
+                slots[index] = value
+
+    def variables(self):
+        return [var for index, val in self.kwargs for var in val.variables()]
+
+    def compile(self, compiler):
+        if not self.kwargs:
+            compiler.nodelist(self.nodelist)
+            return
+        slots = compiler.local('_slots')
+        saved = compiler.local('_saved')
+        compiler.write('%s = context.bind_slots(%d)' % (slots, self.size))
+        targets = ', '.join('%s[%d]' % (slots, index) for index, val in self.kwargs) + ','
+        compiler.write('%s = %s' % (saved, targets))
+        with compiler.block('try:'):
+            # Resolve all values before binding any, as render_into does.
+            compiler.write('%s = %s,' % (targets, ', '.join(
+                '%s.resolve(context)' % compiler.const(val)
+                for index, val in self.kwargs
+            )))
+            compiler.nodelist(self.nodelist)
+        with compiler.block('finally:'):
+            compiler.write('%s = %s' % (targets, saved))
 
 # XXX class TemplateLiteral(Literal):
 # XXX class TemplateIfParser(IfParser):
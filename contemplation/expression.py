@@ -12,6 +12,9 @@ Expression parsing.
 from io import StringIO
 import tokenize
 
+from .base import FILTERS, evaluate
+from .context import MISSING
+
 
 class ExprNode(object):
     '''Common code for Expression/FilterExpr'''
@@ -45,6 +48,7 @@ class Lookup(ExprNode):
         current = context[current]
         for bit in steps:
             bit = self.resolve(bit, context)
+            owner = current
             try:
                 current = current[bit]
             except KeyError:
@@ -55,11 +59,9 @@ class Lookup(ExprNode):
                         current = current[int(bit)]
                     except (IndexError, ValueError, KeyError, TypeError):
                         raise ValueError("Can't get %r from %r" % (bit, current))
-            if callable(current):
-                try:
-                    current = current()
-                except TypeError:
-                    return context.invalid
+            current = evaluate(current, owner, bit, context)
+            if current is MISSING:
+                return context.invalid
         return current
 
 class Filter(ExprNode):
@@ -69,18 +71,19 @@ class Filter(ExprNode):
     def __init__(self, root, filter_name, arg):
         self.root = root
         self.filter = filter_name
+        try:
+            self.filter_func = FILTERS[filter_name]
+        except KeyError:
+            raise SyntaxError('Invalid filter: %r' % (filter_name,))
         self.arg = arg
 
     def __call__(self, context):
-        # Retrieve the filter function
-        filter_func = lambda x, y: x
         root = self.resolve(self.root, context)
         # Resolve the arg, if we have one
         args = []
         if self.arg is not None:
             args.append(self.resolve(self.arg, context))
-        # Yield the value...
-        return filter_func(root, *args)
+        return self.filter_func(root, *args)
 
 class Expression(ExprNode):
     '''
@@ -180,11 +183,11 @@ class FilterExpression(object):
         '''
         filter_name = self.next()
         if filter_name.exact_type != tokenize.NAME:
-            raise SyntaxError('Invalid filter syntax: %r' % (tok.string,))
+            raise SyntaxError('Invalid filter syntax: %r' % (filter_name.string,))
 
         tok = self.next()
         if tok.exact_type == tokenize.COLON:
             arg, tok = self.parse_lookup()
         else:
             arg = None
-        return Filter(filter_name.string, root, arg), tok
+        return Filter(root, filter_name.string, arg), tok
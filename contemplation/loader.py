@@ -0,0 +1,199 @@
+
+'''
+Filesystem template loader, with an in-process cache of parsed Templates.
+
+    loader = Loader(['templates/'], cache_size=500, check_interval=2)
+    tmpl = loader.get_template('index.html')
+
+Cached templates are checked for changes by comparing the mtimes of the
+file and those of any templates it extends, at most once every
+``check_interval`` seconds.  Pass ``check_interval=None`` in
+production to never stat a template once it's cached.
+
+Pass a ``BytecodeCache`` as ``bytecode_cache`` to also keep parsed templates
+on disk, so new processes don't pay for parsing on first use.
+'''
+
+from collections import OrderedDict
+from threading import Lock, local
+import io
+import os
+import time
+
+from .base import Template, TemplateDoesNotExist, TemplateSyntaxError
+from .loadertags import attach, source_hash
+
+
+class CacheEntry(object):
+    __slots__ = ('template', 'files', 'checked')
+
+    def __init__(self, template, files, checked):
+        self.template = template
+        # (path, mtime) of the source, and of each dependency
+        self.files = files
+        self.checked = checked
+
+
+class Loader(object):
+    '''
+    Finds templates in a list of directories, keeping up to ``cache_size``
+    parsed Templates in an LRU cache.
+
+    ``hits``, ``misses``, ``reloads`` and ``evictions`` count cache activity.
+
+    Loaders can be pickled, along with templates that include by a variable
+    name; the cache is left behind.
+    '''
+    def __init__(self, dirs, cache_size=128, check_interval=1.0,
+            compiled=False, encoding='utf-8', bytecode_cache=None, autoescape=True):
+        if isinstance(dirs, str):
+            dirs = [dirs]
+        self.dirs = [os.path.abspath(path) for path in dirs]
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self.compiled = compiled
+        self.encoding = encoding
+        self.bytecode_cache = bytecode_cache
+        self.autoescape = autoescape
+        self.setup()
+
+    def setup(self):
+        self.cache = OrderedDict()
+        self.lock = Lock()
+        # Names being loaded by this thread, to catch loops
+        self.loading = local()
+        self.reset_stats()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('cache', 'lock', 'loading'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.setup()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'evictions': self.evictions,
+            'size': len(self.cache),
+        }
+
+    def find_template(self, name):
+        '''
+        Return the full path of the first file matching ``name`` in our
+        search path.
+        '''
+        for root in self.dirs:
+            path = os.path.abspath(os.path.join(root, name))
+            # Don't allow escaping the template directory
+            if not path.startswith(root + os.sep):
+                continue
+            if os.path.isfile(path):
+                return path
+        raise TemplateDoesNotExist(name)
+
+    def read(self, path):
+        with io.open(path, encoding=self.encoding) as fin:
+            return fin.read()
+
+    def load_template(self, name, path):
+        source = self.read(path)
+        if self.bytecode_cache is None:
+            return self.build(source, name)
+        key = self.bytecode_cache.key(source, name, self.compiled, self.autoescape)
+        template = self.bytecode_cache.load(key)
+        if template is not None and not self.dependencies_current(template):
+            template = None
+        if template is None:
+            template = self.build(source, name)
+            self.bytecode_cache.dump(key, template)
+        else:
+            attach(template.root.nodelist, self)
+        return template
+
+    def build(self, source, name):
+        return Template(source, name=name, compiled=self.compiled, loader=self,
+            autoescape=self.autoescape)
+
+    def dependencies_current(self, template):
+        '''
+        Are the templates ``template`` was built from unchanged?
+        '''
+        for name, digest in template.dependencies.items():
+            try:
+                source = self.read(self.find_template(name))
+            except (TemplateDoesNotExist, IOError):
+                return False
+            if source_hash(source) != digest:
+                return False
+        return True
+
+    def get_template(self, name):
+        now = time.time()
+        with self.lock:
+            entry = self.cache.get(name)
+            if entry is not None:
+                if not self.is_stale(entry, now):
+                    self.cache.move_to_end(name)
+                    self.hits += 1
+                    return entry.template
+                self.reloads += 1
+            else:
+                self.misses += 1
+
+        path = self.find_template(name)
+        mtime = os.stat(path).st_mtime
+        loading = self.loading.__dict__.setdefault('names', set())
+        if name in loading:
+            raise TemplateSyntaxError('%r extends or includes itself' % name)
+        loading.add(name)
+        try:
+            template = self.load_template(name, path)
+        finally:
+            loading.discard(name)
+        files = [(path, mtime)]
+        for dependency in template.dependencies:
+            path = self.find_template(dependency)
+            files.append((path, os.stat(path).st_mtime))
+
+        with self.lock:
+            self.cache[name] = CacheEntry(template, files, now)
+            self.cache.move_to_end(name)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+        return template
+
+    def is_stale(self, entry, now):
+        '''
+        Has the source of this entry changed?  Only stats the file if
+        ``check_interval`` has passed since the last time we looked.
+        '''
+        if self.check_interval is None:
+            return False
+        if now - entry.checked < self.check_interval:
+            return False
+        entry.checked = now
+        try:
+            for path, mtime in entry.files:
+                if os.stat(path).st_mtime != mtime:
+                    return True
+        except OSError:
+            return True
+        return False
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
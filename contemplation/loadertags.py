@@ -0,0 +1,251 @@
+
+'''
+Template inheritance and inclusion.
+
+{% extends %} and {% block %} are resolved when a template is loaded.  The
+block bodies from every level are spliced into the base template's layout,
+with {{ block.super }} replaced by the body it refers to, so rendering
+never looks at a parent template.
+
+{% include %} of a literal name is likewise replaced by the included
+template's nodes.
+'''
+
+from copy import copy
+from hashlib import sha1
+
+from .base import (
+    register, Node, Nodelist, TextNode, VarNode, FilterExpression, TemplateSyntaxError,
+)
+from .defaulttags import WithNode
+from .optimise import optimise
+
+
+@register.tag('block')
+class BlockNode(Node):
+    '''
+    {% block name %}...{% endblock %}
+
+    Only seen in unresolved layouts; templates render the spliced result.
+    '''
+    __slots__ = ('name',)
+    close_tag = 'endblock'
+    child_nodelists = ('nodelist',)
+    raw_token = True
+    def __init__(self, token):
+        super(BlockNode, self).__init__()
+        bits = token.split()
+        if len(bits) != 2:
+            raise TemplateSyntaxError("'block' tag takes one argument: %s" % token)
+        self.name = bits[1]
+
+    def render_into(self, context, out):
+        self.nodelist.render_into(context, out)
+
+    def stream(self, context):
+        return self.nodelist.stream(context)
+
+    def compile(self, compiler):
+        compiler.nodelist(self.nodelist)
+
+
+@register.tag('extends')
+class ExtendsNode(Node):
+    '''
+    {% extends "base.html" %}
+
+    Must be the first tag in the template.  The name must be a literal, so
+    the parent can be loaded along with the child.
+    '''
+    __slots__ = ('parent_name',)
+    def __init__(self, parent_name):
+        super(ExtendsNode, self).__init__()
+        if isinstance(parent_name, FilterExpression):
+            raise TemplateSyntaxError("'extends' takes a literal template name")
+        self.parent_name = parent_name
+
+
+@register.tag('include')
+class IncludeNode(Node):
+    '''
+    {% include "partial.html" %}
+    {% include name a=b %}
+
+    Includes of a literal name are replaced by the template's nodes when the
+    includer is loaded.  Others find the template through the Loader as
+    they're rendered.  Any keyword arguments are bound as for "with".
+    '''
+    __slots__ = ('template_name', 'kwargs', 'loader')
+    def __init__(self, template_name, **kwargs):
+        super(IncludeNode, self).__init__()
+        self.template_name = template_name
+        self.kwargs = kwargs
+        self.loader = None
+
+    def get_template(self, context):
+        return self.loader.get_template(self.template_name.resolve(context))
+
+    # The included template's nodes render into the includer's output, as
+    # part of the same render: Template.render would start a fresh memo
+    def render_into(self, context, out):
+        self.get_template(context).root.nodelist.render_into(context, out)
+
+    def stream(self, context):
+        return self.get_template(context).root.nodelist.stream(context)
+
+    async def render_async(self, context, out):
+        name = await self.template_name.resolve_async(context)
+        await self.loader.get_template(name).root.nodelist.render_async(context, out)
+
+    def variables(self):
+        return self.template_name.variables()
+
+
+def source_hash(source):
+    return sha1(source.encode('utf-8')).hexdigest()
+
+
+def inherit(template, loader):
+    '''
+    Resolve the blocks of a freshly parsed template, loading its parents
+    from ``loader``.
+
+    Sets ``layout`` (the unresolved base template's Nodelist) and
+    ``blocks`` (a list of BlockNodes for each name, most derived first),
+    for templates extending this one to build on.
+    '''
+    nodelist = template.root.nodelist
+    first = next((node for node in nodelist if type(node) is not TextNode), None)
+    blocks = {}
+    find_blocks(nodelist, blocks, first)
+
+    if isinstance(first, ExtendsNode):
+        if loader is None:
+            raise TemplateSyntaxError("'extends' can only be used with a Loader")
+        parent = loader.get_template(first.parent_name)
+        layout = parent.layout
+        chains = dict(parent.blocks)
+        for name, block in blocks.items():
+            chains[name] = [block] + parent.blocks.get(name, [])
+        depend(template, parent)
+    else:
+        layout = nodelist
+        chains = {name: [block] for name, block in blocks.items()}
+
+    template.layout = layout
+    template.blocks = chains
+    if chains or layout is not nodelist:
+        template.root.nodelist = splice(layout, chains, None)
+
+
+def depend(template, other):
+    template.dependencies.update(other.dependencies)
+    template.dependencies[other.name] = source_hash(other.source)
+
+
+def include(template, loader):
+    '''
+    Resolve the includes in a freshly parsed template.
+    '''
+    template.root.nodelist = expand(template.root.nodelist, template, loader)
+
+
+def expand(nodelist, template, loader):
+    '''
+    Return ``nodelist`` with static includes replaced by the included nodes.
+    The template's own nodes are changed in place, but its Nodelists are
+    only replaced if they held an include.
+    '''
+    result = Nodelist()
+    changed = False
+    for node in nodelist:
+        if not isinstance(node, IncludeNode):
+            for name in node.child_nodelists:
+                setattr(node, name, expand(getattr(node, name), template, loader))
+            result.append(node)
+            continue
+        changed = True
+        if loader is None:
+            raise TemplateSyntaxError("'include' can only be used with a Loader")
+        if isinstance(node.template_name, FilterExpression):
+            node.loader = loader
+            body = [node]
+        else:
+            included = loader.get_template(node.template_name)
+            depend(template, included)
+            body = included.root.nodelist
+        if node.kwargs:
+            wrapper = WithNode(**node.kwargs)
+            wrapper.nodelist.extend(body)
+            optimise(wrapper.nodelist, recursive=False)
+            body = [wrapper]
+        result.extend(body)
+    if not changed:
+        return nodelist
+    return optimise(result, recursive=False)
+
+
+def attach(nodelist, loader):
+    '''
+    Point the includes by variable name in ``nodelist`` at ``loader``, as
+    a template unpickled from a bytecode cache brings its own copy.
+    '''
+    for node in nodelist:
+        if isinstance(node, IncludeNode):
+            node.loader = loader
+        for name in node.child_nodelists:
+            attach(getattr(node, name), loader)
+
+
+def find_blocks(nodelist, blocks, first):
+    for node in nodelist:
+        if isinstance(node, BlockNode):
+            if node.name in blocks:
+                raise TemplateSyntaxError("'block' tag with name %r appears more than once" % node.name)
+            blocks[node.name] = node
+        elif isinstance(node, ExtendsNode) and node is not first:
+            raise TemplateSyntaxError("'extends' must be the first tag in the template")
+        for name in node.child_nodelists:
+            find_blocks(getattr(node, name), blocks, first)
+
+
+def is_super(node):
+    return type(node) is VarNode and node.token.variable == 'block.super'
+
+
+def has_blocks(node):
+    for name in node.child_nodelists:
+        for child in getattr(node, name):
+            if isinstance(child, BlockNode) or is_super(child) or has_blocks(child):
+                return True
+    return False
+
+
+def splice(nodelist, chains, block_super):
+    '''
+    Return a copy of ``nodelist`` with each block replaced by the body of
+    its most derived version, and {{ block.super }} by ``block_super``.
+    Nodes without blocks inside are shared, not copied.
+    '''
+    result = Nodelist()
+    for node in nodelist:
+        if isinstance(node, BlockNode):
+            result.extend(resolve_block(chains.get(node.name, [node]), chains))
+        elif block_super is not None and is_super(node):
+            result.extend(block_super)
+        elif has_blocks(node):
+            node = copy(node)
+            for name in node.child_nodelists:
+                setattr(node, name, splice(getattr(node, name), chains, block_super))
+            result.append(node)
+        else:
+            result.append(node)
+    return optimise(result, recursive=False)
+
+
+def resolve_block(chain, chains):
+    if len(chain) > 1:
+        block_super = resolve_block(chain[1:], chains)
+    else:
+        block_super = Nodelist()
+    return splice(chain[0].nodelist, chains, block_super)
@@ -0,0 +1,44 @@
+
+'''
+Optimisation pass over a parsed node tree.
+
+- literal VarNodes (including pure filters of literals) are folded into text
+- adjacent TextNodes are merged (including those split by comments)
+- empty TextNodes are dropped
+- single node Nodelists are collapsed
+'''
+
+from .base import TextNode, VarNode
+
+
+def optimise(nodelist, recursive=True):
+    '''Optimise a Nodelist, and unless told not to its children, in place.'''
+    result = []
+    text = []
+    for node in nodelist:
+        if recursive:
+            for name in node.child_nodelists:
+                optimise(getattr(node, name))
+
+        if type(node) is VarNode and node.token.literal is not None:
+            text.append(node.display(node.token.literal))
+            continue
+        if type(node) is TextNode:
+            text.append(node.content)
+            continue
+
+        if text:
+            flush_text(result, text)
+        result.append(node)
+    flush_text(result, text)
+
+    nodelist[:] = result
+    nodelist.collapse()
+    return nodelist
+
+
+def flush_text(result, text):
+    content = ''.join(text)
+    if content:
+        result.append(TextNode(content))
+    del text[:]
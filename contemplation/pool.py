@@ -0,0 +1,86 @@
+
+'''
+Render one template with many contexts, across a pool of processes.
+
+    for output in render_many(template, rows, workers=8):
+        send(output)
+
+The template is pickled once and handed to each worker as it starts.
+Contexts are sent in chunks, so each round trip carries many renders.
+'''
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from collections import deque
+from itertools import islice
+import os
+import pickle
+
+from .context import Context
+
+# The template for this worker process, set by init_worker.
+_template = None
+_invalid = ''
+
+
+def init_worker(data, invalid):
+    global _template, _invalid
+    _template = pickle.loads(data)
+    _invalid = invalid
+
+
+def render_chunk(chunk):
+    render = _template.render
+    return [render(Context(data, invalid=_invalid)) for data in chunk]
+
+
+def render_many(template, contexts, workers=None, chunk_size=100, ordered=True, invalid=''):
+    '''
+    Render ``template`` with each dict in ``contexts``, using ``workers``
+    processes (by default, one per CPU).
+
+    Yields the outputs in the order of ``contexts``.  If ``ordered`` is
+    False, yields (index, output) pairs as soon as each chunk is done.
+
+    ``contexts`` may be a generator: only two chunks per worker are read
+    ahead of the results taken.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    data = pickle.dumps(template, pickle.HIGHEST_PROTOCOL)
+    contexts = iter(contexts)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(data, invalid)) as pool:
+        limit = workers * 2
+        pending = deque()
+        start = 0
+
+        def submit():
+            nonlocal start
+            chunk = list(islice(contexts, chunk_size))
+            if not chunk:
+                return False
+            pending.append((start, pool.submit(render_chunk, chunk)))
+            start += len(chunk)
+            return True
+
+        try:
+            while len(pending) < limit and submit():
+                pass
+            if ordered:
+                while pending:
+                    index, future = pending.popleft()
+                    outputs = future.result()
+                    submit()
+                    yield from outputs
+            else:
+                while pending:
+                    done, _ = wait([future for index, future in pending], return_when=FIRST_COMPLETED)
+                    for index, future in list(pending):
+                        if future in done:
+                            pending.remove((index, future))
+                            submit()
+                            for offset, output in enumerate(future.result()):
+                                yield index + offset, output
+        finally:
+            # Don't render chunks nobody will see if we were stopped early
+            for index, future in pending:
+                future.cancel()
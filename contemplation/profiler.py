@@ -0,0 +1,154 @@
+
+'''
+Find where the time goes in rendering.
+
+    profiler = Profiler()
+    output = profiler.render(template, context)
+    print(profiler.table())
+    open('render.folded', 'w').write(profiler.collapsed())
+
+Each tag is timed and counted, along with the output it produced, under
+the template name and line it came from.  ``collapsed`` gives the stacks in
+the format read by flamegraph.pl and speedscope.
+
+Templates aren't changed: the profiler renders an instrumented copy of the
+node tree, so normal rendering costs nothing extra.
+'''
+
+from copy import copy
+from time import perf_counter
+
+from .base import Node, Nodelist
+
+
+class NodeStats(object):
+    '''Totals for the nodes parsed from one tag.'''
+    def __init__(self, origin):
+        self.origin = origin
+        self.calls = 0
+        # Including, and excluding, time spent in child nodes
+        self.cumulative = 0.0
+        self.own = 0.0
+        self.size = 0
+
+
+class Profiler(object):
+    def __init__(self):
+        self.stats = {}
+        # Self time of each distinct stack of origins
+        self.stacks = {}
+        self.stack = []
+        # Time spent in children of each open node
+        self.child_time = []
+        self.instrumented = {}
+
+    def render(self, template, context):
+        '''Render ``template``, recording where the time was spent.'''
+        try:
+            nodelist = self.instrumented[template]
+        except KeyError:
+            nodelist = self.instrumented[template] = self.instrument(template.root.nodelist)
+        root = (template.name, 0, '<template>')
+        context.clear_memo()
+        return self.measure(root, nodelist.render, context, None)
+
+    def instrument(self, nodelist):
+        '''
+        Return a copy of ``nodelist`` with each node wrapped in a
+        ProfiledNode.  Nodes are copied, so the originals are left alone.
+        '''
+        result = Nodelist()
+        for node in nodelist:
+            if node.child_nodelists:
+                node = copy(node)
+                for name in node.child_nodelists:
+                    setattr(node, name, self.instrument(getattr(node, name)))
+            if node.origin is not None:
+                node = ProfiledNode(node, self)
+            result.append(node)
+        result.collapse()
+        return result
+
+    def measure(self, origin, func, context, out):
+        '''Call ``func(context, out)`` as a frame of the profile.'''
+        self.stack.append(origin)
+        self.child_time.append(0.0)
+        upto = None if out is None else len(out)
+        start = perf_counter()
+        try:
+            if out is None:
+                result = func(context)
+            else:
+                result = func(context, out)
+        finally:
+            elapsed = perf_counter() - start
+            own = elapsed - self.child_time.pop()
+            if self.child_time:
+                self.child_time[-1] += elapsed
+            stack = tuple(self.stack)
+            self.stack.pop()
+        stats = self.stats.get(origin)
+        if stats is None:
+            stats = self.stats[origin] = NodeStats(origin)
+        stats.calls += 1
+        stats.cumulative += elapsed
+        stats.own += own
+        if out is None:
+            stats.size += len(result.encode('utf-8'))
+        else:
+            stats.size += sum(len(chunk.encode('utf-8')) for chunk in out[upto:])
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + own
+        return result
+
+    def sorted_stats(self, key='cumulative'):
+        return sorted(self.stats.values(), key=lambda stats: getattr(stats, key), reverse=True)
+
+    def table(self, key='cumulative', limit=None):
+        '''
+        Return a text table of the nodes, most expensive first, sorted by
+        ``key``: one of cumulative, own, calls or size.
+        '''
+        lines = ['%10s %10s %8s %10s  %s' % ('cumul ms', 'own ms', 'calls', 'bytes', 'location')]
+        for stats in self.sorted_stats(key)[:limit]:
+            lines.append('%10.3f %10.3f %8d %10d  %s' % (
+                stats.cumulative * 1000, stats.own * 1000, stats.calls, stats.size,
+                frame(stats.origin),
+            ))
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self):
+        '''
+        Return the stacks in collapsed format: one line per stack of frames
+        joined by ";", followed by its own time in microseconds.
+        '''
+        lines = sorted(
+            '%s %d' % (';'.join(map(frame, stack)), round(own * 1e6))
+            for stack, own in self.stacks.items()
+        )
+        return '\n'.join(lines) + '\n'
+
+
+class ProfiledNode(Node):
+    '''Records each render_into of the node it wraps.'''
+    __slots__ = ('node', 'profiler')
+
+    def __init__(self, node, profiler):
+        super(ProfiledNode, self).__init__()
+        self.origin = node.origin
+        self.node = node
+        self.profiler = profiler
+
+    def render_into(self, context, out):
+        self.profiler.measure(self.origin, self.node.render_into, context, out)
+
+    def stream(self, context):
+        return self.node.stream(context)
+
+    async def render_async(self, context, out):
+        await self.node.render_async(context, out)
+
+
+def frame(origin):
+    name, line, label = origin
+    label = ' '.join(label.split()).replace(';', ',')
+    return '%s:%d %s' % (name or '<string>', line, label)
@@ -0,0 +1,65 @@
+
+'''
+HTML escaping, and marking strings as not needing it.
+
+Anything with an ``__html__`` method is taken as already safe, so markup
+from other libraries that follow that convention passes through.
+'''
+
+try:
+    unicode
+except NameError: # Py3
+    unicode = str
+
+
+class SafeString(unicode):
+    '''A string which is safe to output as HTML without escaping.'''
+    __slots__ = ()
+
+    def __html__(self):
+        return self
+
+    def __add__(self, other):
+        result = super(SafeString, self).__add__(other)
+        if hasattr(other, '__html__'):
+            return SafeString(result)
+        return result
+
+    def __str__(self):
+        return self
+
+
+def mark_safe(value):
+    if hasattr(value, '__html__'):
+        return value
+    return SafeString(value)
+
+
+def escape_text(text):
+    '''
+    Escape a str for HTML, returning it unchanged (not a copy) if there's
+    nothing to escape.
+    '''
+    # Scanning for each character is much faster than one regex search, and
+    # most values have none of them.
+    if '&' in text or '<' in text or '>' in text or '"' in text or "'" in text:
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace(
+            '>', '&gt;').replace('"', '&quot;').replace("'", '&#x27;')
+    return text
+
+
+def escape(value):
+    '''Escape any value for HTML, even if it's marked safe.'''
+    return SafeString(escape_text(unicode(value)))
+
+
+def conditional_escape(value):
+    '''
+    Return the HTML for ``value``: escaped, unless it's marked safe.  The
+    result is a str, left as a SafeString if the value's HTML was one.
+    '''
+    if type(value) is not unicode:
+        if hasattr(value, '__html__'):
+            return unicode(value.__html__())
+        value = unicode(value)
+    return escape_text(value)
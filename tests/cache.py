@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from contemplation import Template, Context, TemplateSyntaxError
+from contemplation.cache import FileCache, LocalCache, caches
+
+class Counter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self.count
+
+class CacheTagTests(unittest.TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_cached(self):
+        for compiled in (False, True):
+            caches['default'].clear()
+            t = Template('{% cache 60 "frag" %}{{ n }}{% endcache %}', compiled=compiled)
+            n = Counter()
+            self.assertEqual(t.render(Context({'n': n})), '1')
+            self.assertEqual(t.render(Context({'n': n})), '1')
+            self.assertEqual(''.join(t.stream(Context({'n': n}))), '1')
+
+    def test_vary_on(self):
+        t = Template('{% cache 60 "frag" a b %}{{ n }}{% endcache %}')
+        n = Counter()
+        outputs = [
+            t.render(Context(dict(ctx, n=n)))
+            for ctx in [{'a': 1, 'b': 2}, {'a': 1, 'b': 2}, {'a': 12, 'b': ''}, {'a': 1}, {'a': 1, 'b': 2}]
+        ]
+        self.assertEqual(outputs, ['1', '1', '2', '3', '1'])
+
+    def test_timeout(self):
+        t = Template('{% cache timeout "frag" %}{{ n }}{% endcache %}')
+        n = Counter()
+        self.assertEqual(t.render(Context({'n': n, 'timeout': -1})), '1')
+        self.assertEqual(t.render(Context({'n': n, 'timeout': None})), '2')
+        self.assertEqual(t.render(Context({'n': n, 'timeout': -1})), '2')
+
+    def test_using(self):
+        root = tempfile.mkdtemp()
+        caches['files'] = FileCache(root)
+        try:
+            t = Template('{% cache 60 "frag" using="files" %}{{ n }}{% endcache %}')
+            n = Counter()
+            t.render(Context({'n': n}))
+            caches['files'] = FileCache(root)
+            self.assertEqual(t.render(Context({'n': n})), '1')
+        finally:
+            del caches['files']
+            shutil.rmtree(root)
+
+    def test_async(self):
+        async def value():
+            return 'async'
+        t = Template('{% cache 60 "frag" %}{{ v }}{% endcache %}')
+        self.assertEqual(asyncio.run(t.render_async(Context({'v': value()}))), 'async')
+        self.assertEqual(t.render(Context()), 'async')
+
+    def test_bad_args(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% cache 60 "frag" other=1 %}{% endcache %}')
+
+class BackendTests(unittest.TestCase):
+
+    def check(self, cache):
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 'Ä\r\n')
+        self.assertEqual(cache.get('a'), 'Ä\r\n')
+        cache.set('b', 'x', -1)
+        self.assertIsNone(cache.get('b'))
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+
+    def test_local(self):
+        self.check(LocalCache())
+
+    def test_file(self):
+        root = tempfile.mkdtemp()
+        try:
+            self.check(FileCache(root))
+        finally:
+            shutil.rmtree(root)
+
+    def test_lru(self):
+        cache = LocalCache(max_size=10)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        cache.get('a')
+        cache.set('c', 'cccc')
+        self.assertEqual(cache.get('a'), 'aaaa')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.size, 8)
+        cache.set('d', 'd' * 11)
+        self.assertIsNone(cache.get('d'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from contemplation import Context, Template, render_rows, stream_rows
+
+class User(object):
+    def __init__(self, name):
+        self.name = name
+
+    def greeting(self):
+        return 'Hi %s' % self.name
+
+class RenderRowsTests(unittest.TestCase):
+
+    def test_columns(self):
+        t = Template('<td>{{ user.name }}</td><td>{{ total|add:extra }}%</td>\n')
+        rows = render_rows(t, {
+            'user.name': ['a', '<b>'],
+            'total': [1, 2],
+            'extra': [10, 20],
+        })
+        self.assertEqual(rows, [
+            '<td>a</td><td>11%</td>\n',
+            '<td>&lt;b&gt;</td><td>22%</td>\n',
+        ])
+
+    def test_prefix(self):
+        # Paths not given as columns are looked up on the longest prefix
+        t = Template('{{ user.name|upper }} {{ user.greeting }} {{ user.age }}', autoescape=False)
+        rows = render_rows(t, {'user': [User('x'), User('y')]}, invalid='?')
+        self.assertEqual(rows, ['X Hi x ?', 'Y Hi y ?'])
+
+    def test_missing(self):
+        t = Template('[{{ a|default:"none" }}][{{ b|add:c }}][{{ True }}]')
+        self.assertEqual(render_rows(t, {'b': [1]}), ['[none][][True]'])
+
+    def test_tags(self):
+        # Other tags render row by row, matching a normal render
+        source = '{% for x in user.items %}{{ x }},{% endfor %}{% with n=user.name %}<{{ n }}>{% endwith %}'
+        t = Template(source)
+        columns = {'user.name': ['p', ''], 'user.items': [[1, 2], []]}
+        self.assertEqual(render_rows(t, columns), ['1,2,<p>', '<>'])
+
+    def test_stream(self):
+        t = Template('{{ n }}-{{ n|add:"1" }};')
+        count = 25
+        columns = {'n': list(range(count))}
+        expected = [t.render(Context({'n': n})) for n in range(count)]
+        self.assertEqual(list(stream_rows(t, columns, batch_size=4)), expected)
+        self.assertEqual(render_rows(t, columns), expected)
+
+    def test_lengths(self):
+        t = Template('{{ a }}{{ b }}')
+        with self.assertRaises(ValueError):
+            render_rows(t, {'a': [1, 2], 'b': [1]})
+        self.assertEqual(render_rows(t, {}), [])
+        self.assertEqual(render_rows(Template('text'), {'a': [1, 2]}), ['text', 'text'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from contemplation import Template, Context, TemplateSyntaxError
+from contemplation.base import register, Node
+
+@register.tag('shout')
+class ShoutNode(Node):
+    '''A tag with no compile method.'''
+    def __init__(self, value):
+        super(ShoutNode, self).__init__()
+        self.value = value
+
+    def render(self, context):
+        return self.value.upper()
+
+@register.tag('box')
+class BoxNode(Node):
+    '''A block tag with no slots and no child_nodelists.'''
+    close_tag = 'endbox'
+
+    def render(self, context):
+        return '[%s]' % self.nodelist.render(context)
+
+@register.tag('split')
+class SplitNode(BoxNode):
+    '''Lists a branch tag, but doesn't handle it.'''
+    close_tag = 'endsplit'
+    branch_tags = ('half',)
+
+class SomeClass:
+    def method(self):
+        return "SomeClass.method"
+
+class CompileTests(unittest.TestCase):
+
+    CASES = (
+        ("something cool", {}, "something cool"),
+        ("", {}, ""),
+        ("{{ headline }}", {'headline': 'Success'}, "Success"),
+        ("as{{ missing }}df", {}, "asINVALIDdf"),
+        ("{{ var.method }}", {"var": SomeClass()}, "SomeClass.method"),
+        ('{{ "fred" }} {{ 1.2 }}', {}, "fred 1.2"),
+        ("{# hidden #}hello", {}, "hello"),
+        ('{% for x in y %}{{ x }}{% endfor %}', {'x': 'BAD', 'y': range(3)}, '012'),
+        ('{% for x in y reversed %}{{ x }}{% endfor %}', {'y': [1, 2, 3]}, '321'),
+        ('{% for x in y %}{% endfor %}', {'y': [1, 2, 3]}, ''),
+        ("{% for k, v in items %}{{ k }}:{{ v }}/{% endfor %}", {"items": (('one', 1), ('two', 2))}, "one:1/two:2/"),
+        ('{% with a=7 %}{{ a }}{% endwith %}', {'a': 'BAD'}, '7'),
+        ('{% with a=b b=a %}{{ a }}{{ b }}{% endwith %}', {'a': 1, 'b': 2}, '21'),
+        ('{% with %}hi{% endwith %}', {}, 'hi'),
+        ('{% for x in y %}{% with b=x %}{{ b }}{% endwith %}{% endfor %}{{ b }}', {'y': '123'}, '123INVALID'),
+    )
+
+    def test_matches_tree(self):
+        for tmpl, ctx, output in self.CASES:
+            for compiled in (False, True):
+                t = Template(tmpl, compiled=compiled)
+                c = Context(ctx, invalid='INVALID')
+                self.assertEqual(t.render(c), output)
+
+    def test_fallback(self):
+        # Nodes without a compile method are rendered through render()
+        t = Template('<{% shout "hi" %}>', compiled=True)
+        self.assertEqual(t.render(Context()), '<HI>')
+
+    def test_block_tag(self):
+        # Block tags get a nodelist, and their children are optimised
+        for compiled in (False, True):
+            t = Template('{% box %}x{{ "y" }}{{ a }}{% endbox %}', compiled=compiled)
+            self.assertEqual(len(t.root.nodelist[0].nodelist), 2)
+            self.assertEqual(t.render(Context({'a': 'z'})), '[xyz]')
+
+    def test_unhandled_branch(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% split %}a{% half %}b{% endsplit %}')
+
+    def test_deep(self):
+        # Nesting past Python's block limit falls back to rendering nodes
+        source = '{% for x in y %}{% with a=x %}' * 30 + '{{ a }}' + '{% endwith %}{% endfor %}' * 30
+        t = Template(source, compiled=True)
+        self.assertEqual(t.render(Context({'y': 'a'})), 'a')
+
+if __name__ == '__main__':
+    unittest.main()
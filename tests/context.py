@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from threading import Thread
+import unittest
+
+from contemplation import Context, Lazy, Template, impure
+from contemplation.context import SLOTS
+
+class User(object):
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def full_name(self):
+        self.calls += 1
+        return self.name.title()
+
+    @impure
+    def tick(self):
+        self.calls += 1
+        return self.calls
+
+class ContextTests(unittest.TestCase):
+
+    def test_push_pop(self):
+        c = Context({'a': 1, 'b': 1})
+        with c.push(a=2):
+            c['b'] = 2
+            with c.push({'a': 3}):
+                self.assertEqual((c['a'], c['b']), (3, 2))
+            self.assertEqual((c['a'], c['b']), (2, 2))
+        self.assertEqual((c['a'], c['b']), (1, 1))
+        with self.assertRaises(IndexError):
+            c.pop()
+
+    def test_builtins(self):
+        c = Context({'True': 'yes'})
+        self.assertIs(c['True'], True)
+        self.assertIsNone(c.get('missing'))
+        self.assertNotIn('missing', c)
+
+    def test_flatten(self):
+        c = Context({'a': 1})
+        self.assertEqual(c.flatten(), {'a': 1, 'True': True, 'False': False, 'None': None})
+        with c.push(b=2) as scope:
+            self.assertEqual(len(c), 5)
+            scope['c'] = 3
+            self.assertEqual(sorted(c)[-2:], ['b', 'c'])
+            del scope['b']
+            self.assertNotIn('b', c.flatten())
+        self.assertEqual(len(c), 4)
+
+    def test_flatten_current(self):
+        # Changes to the data passed in are seen, and bound names included
+        d = {'a': 1}
+        c = Context(d)
+        c.flatten()
+        d['z'] = 2
+        self.assertIn('z', c)
+        self.assertIn('z', c.flatten())
+        self.assertEqual(len(c), 5)
+        Template('{% with bound_name=1 %}{% endwith %}')
+        c.bind_slots(SLOTS['bound_name'] + 1)[SLOTS['bound_name']] = 'b'
+        self.assertIn('bound_name', c)
+        self.assertIn('bound_name', list(c))
+        self.assertEqual(len(c), 6)
+        self.assertEqual(dict(c.items())['bound_name'], 'b')
+
+    def test_missing(self):
+        c = Context(defaultdict(lambda: 'default'))
+        self.assertEqual(c['anything'], 'default')
+
+    def test_lazy(self):
+        calls = []
+        def rows():
+            calls.append(1)
+            return [1, 2]
+        created, evaluated = Lazy.created, Lazy.evaluated
+        t = Template('{% for x in rows %}{{ x }}{{ rows.0 }}{% endfor %}{{ rows|length }}', compiled=True)
+        c = Context({'rows': Lazy(rows), 'unused': Lazy(rows), 'other': 1})
+        self.assertEqual(t.render(c), '11212')
+        self.assertEqual(calls, [1])
+        self.assertEqual(c.untouched(), ['unused'])
+        self.assertEqual((Lazy.created - created, Lazy.evaluated - evaluated), (2, 1))
+        # The value is kept for the life of the Lazy
+        self.assertEqual(t.render(c), '11212')
+        self.assertEqual(calls, [1])
+
+    def test_lazy_threads(self):
+        created, evaluated = Lazy.created, Lazy.evaluated
+        def work():
+            for n in range(2000):
+                Lazy(int)()
+        threads = [Thread(target=work) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((Lazy.created - created, Lazy.evaluated - evaluated), (16000, 16000))
+
+    def test_memoise(self):
+        source = '{{ user.full_name }}{% for x in users %}{{ user.full_name }}{{ x.full_name }}{% endfor %}'
+        for compiled in (False, True):
+            t = Template(source, compiled=compiled)
+            user, others = User('ann'), [User('bob'), User('cy')]
+            output = t.render(Context({'user': user, 'users': others}, memoise=True))
+            self.assertEqual(output, 'AnnAnnBobAnnCy')
+            self.assertEqual([user.calls] + [u.calls for u in others], [1, 1, 1])
+            # Without memoise, each lookup calls
+            t.render(Context({'user': user, 'users': others}))
+            self.assertEqual(user.calls, 4)
+
+    def test_memo_reused(self):
+        # A reused Context doesn't carry results over from the last render
+        t = Template('{{ user.full_name }}')
+        user = User('ann')
+        context = Context({'user': user}, memoise=True)
+        self.assertEqual(t.render(context), 'Ann')
+        user.name = 'bob'
+        self.assertEqual(t.render(context), 'Bob')
+        user.name = 'cy'
+        self.assertEqual(''.join(t.stream(context)), 'Cy')
+        self.assertEqual(user.calls, 3)
+
+    def test_impure(self):
+        t = Template('{{ user.tick }}{{ user.tick }}{{ tick }}{{ tick }}')
+        user = User('ann')
+        self.assertEqual(t.render(Context({'user': user, 'tick': user.tick}, memoise=True)), '1234')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import pickle
+import unittest
+
+from contemplation import Template, Context, TemplateSyntaxError, mark_safe
+from contemplation.base import FILTERS, PURE_FILTERS, FilterExpression, TextNode, VarNode, register
+
+@register.filter('wrap')
+def wrap(value, arg='()'):
+    return arg[0] + str(value) + arg[-1]
+
+register.filter('rewrap', wrap, is_safe=True)
+
+CALLS = []
+
+@register.filter('counted')
+def counted(value):
+    CALLS.append(value)
+    return value
+
+@register.filter('shout', pure=True)
+def shout(value, arg='!'):
+    return value.upper() + arg
+
+@register.filter('broken', pure=True)
+def broken(value):
+    raise ValueError(value)
+
+class FilterTests(unittest.TestCase):
+
+    def render(self, tmpl, ctx):
+        outputs = set()
+        for compiled in (False, True):
+            t = Template(tmpl, compiled=compiled)
+            outputs.add(t.render(Context(ctx)))
+            outputs.add(''.join(t.stream(Context(ctx))))
+            outputs.add(asyncio.run(t.render_async(Context(ctx))))
+            outputs.add(pickle.loads(pickle.dumps(t)).render(Context(ctx)))
+        self.assertEqual(len(outputs), 1)
+        return outputs.pop()
+
+    def test_chain(self):
+        self.assertEqual(self.render('{{ a|wrap|wrap:"[]"|upper }}', {'a': 'x'}), '[(X)]')
+        self.assertEqual(self.render('{{ a|wrap:b }}', {'a': 'x', 'b': '<>'}), '&lt;x&gt;')
+        self.assertEqual(self.render('{{ a|default:"none" }}', {}), 'none')
+
+    def test_resolved_at_parse(self):
+        expr = FilterExpression('a|wrap:"{}"|upper')
+        self.assertEqual(expr.filters, ((FILTERS['wrap'], '{}'), (FILTERS['upper'], None)))
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{{ a|nosuchfilter }}')
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{{ a|wrap:"x" junk }}')
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{{ |upper }}')
+
+    def test_safety(self):
+        ctx = {'a': mark_safe('<b>'), 'b': '<b>'}
+        self.assertEqual(self.render('{{ a|rewrap }}{{ a|wrap }}{{ b|rewrap }}', ctx), '(<b>)(&lt;b&gt;)(&lt;b&gt;)')
+        self.assertEqual(self.render('{{ b|safe }}{{ b|escape }}', ctx), '<b>&lt;b&gt;')
+
+    def test_tag_args(self):
+        self.assertEqual(self.render('{% for x in a|cut:"b" %}{{ x }},{% endfor %}', {'a': 'abc'}), 'a,c,')
+        self.assertEqual(self.render('{% with x=a|length %}{{ x }}{% endwith %}', {'a': 'abc'}), '3')
+
+class FoldTests(unittest.TestCase):
+
+    def test_fold(self):
+        t = Template('<{{ "Title"|shout|lower }}{{ "a"|shout:"?" }}>')
+        self.assertEqual([type(node) for node in t.root.nodelist], [TextNode])
+        self.assertEqual(t.render(Context()), '<title!A?>')
+
+    def test_escaped(self):
+        t = Template('{{ "<b>"|upper }}{{ "<b>"|safe|upper }}{{ "<b>"|title }}')
+        self.assertEqual(t.root.nodelist[0].content, '&lt;B&gt;&lt;B&gt;<B>')
+        t = Template('{{ "<b>"|upper }}', autoescape=False)
+        self.assertEqual(t.root.nodelist[0].content, '<B>')
+
+    def test_not_folded(self):
+        for source in ('{{ "a"|counted }}', '{{ "a"|shout:b }}', '{{ a|shout }}', '{{ 1|broken }}'):
+            t = Template(source)
+            self.assertEqual([type(node) for node in t.root.nodelist], [VarNode])
+        del CALLS[:]
+        t = Template('{{ "a"|counted }}')
+        t.render(Context())
+        t.render(Context())
+        self.assertEqual(CALLS, ['a', 'a'])
+
+    def test_safe_numbers(self):
+        # Only string results are marked safe again
+        self.assertIs(type(FILTERS['length'](mark_safe('ab'))), int)
+        t = Template('{{ s|length|yesno:"y,n" }}')
+        for value in ('', mark_safe('')):
+            self.assertEqual(t.render(Context({'s': value})), 'n')
+
+    def test_purity_per_name(self):
+        # Purity belongs to the registered name, not the function
+        register.filter('counted_pure', counted, pure=True)
+        try:
+            self.assertFalse(hasattr(counted, 'pure'))
+            self.assertIs(FILTERS['counted'], counted)
+            self.assertEqual([type(node) for node in Template('{{ "a"|counted_pure }}').root.nodelist], [TextNode])
+            self.assertEqual([type(node) for node in Template('{{ "a"|counted }}').root.nodelist], [VarNode])
+        finally:
+            del FILTERS['counted_pure']
+            PURE_FILTERS.discard('counted_pure')
+
+    def test_tag_args(self):
+        for compiled in (False, True):
+            t = Template('{% with x="abc"|length y=""|default:"d" %}{{ x }}{{ y }}{% endwith %}', compiled=compiled)
+            self.assertEqual(pickle.loads(pickle.dumps(t)).render(Context()), '3d')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from contemplation import (
+    BytecodeCache, Context, Loader, TemplateDoesNotExist, TemplateSyntaxError,
+)
+from contemplation import base
+from contemplation.loadertags import BlockNode
+
+class LoaderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write('index.html', 'Hello {{ name }}')
+        self.write('other.html', 'Other')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as fout:
+            fout.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_load(self):
+        loader = Loader([self.root])
+        t = loader.get_template('index.html')
+        self.assertEqual(t.name, 'index.html')
+        self.assertEqual(t.render(Context({'name': 'World'})), 'Hello World')
+
+    def test_missing(self):
+        loader = Loader([self.root])
+        with self.assertRaises(TemplateDoesNotExist):
+            loader.get_template('missing.html')
+        with self.assertRaises(TemplateDoesNotExist):
+            loader.get_template('../index.html')
+
+    def test_cache(self):
+        loader = Loader([self.root])
+        t = loader.get_template('index.html')
+        self.assertIs(loader.get_template('index.html'), t)
+        self.assertEqual(loader.hits, 1)
+        self.assertEqual(loader.misses, 1)
+
+    def test_lru(self):
+        loader = Loader([self.root], cache_size=1)
+        loader.get_template('index.html')
+        loader.get_template('other.html')
+        loader.get_template('index.html')
+        self.assertEqual(loader.misses, 3)
+        self.assertEqual(loader.evictions, 2)
+        self.assertEqual(list(loader.cache), ['index.html'])
+
+    def test_reload(self):
+        loader = Loader([self.root], check_interval=0)
+        self.write('index.html', 'Old', mtime=1000)
+        self.assertEqual(loader.get_template('index.html').render(Context()), 'Old')
+        self.write('index.html', 'New', mtime=2000)
+        self.assertEqual(loader.get_template('index.html').render(Context()), 'New')
+        self.assertEqual(loader.reloads, 1)
+
+    def test_no_check(self):
+        loader = Loader([self.root], check_interval=None)
+        self.write('index.html', 'Old', mtime=1000)
+        loader.get_template('index.html')
+        self.write('index.html', 'New', mtime=2000)
+        self.assertEqual(loader.get_template('index.html').render(Context()), 'Old')
+
+class InheritanceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write('base.html', '<{% block title %}Base{% endblock %}|{% block body %}{% endblock %}>')
+        self.write('middle.html',
+            '{% extends "base.html" %}ignored'
+            '{% block title %}{{ block.super }}-Middle{% endblock %}'
+            '{% block body %}[{% block inner %}in{% endblock %}]{% endblock %}'
+        )
+        self.write('child.html',
+            '{% extends "middle.html" %}'
+            '{% block title %}{{ block.super }}-{{ name }}{% endblock %}'
+            '{% block inner %}{% for x in y %}{{ block.super }}{{ x }}{% endfor %}{% endblock %}'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    write = LoaderTests.write
+
+    def render(self, name, ctx=None, **kwargs):
+        loader = Loader([self.root], **kwargs)
+        return loader.get_template(name).render(Context(ctx or {}))
+
+    def test_chain(self):
+        ctx = {'name': 'Child', 'y': [1, 2]}
+        for compiled in (False, True):
+            self.assertEqual(self.render('base.html', compiled=compiled), '<Base|>')
+            self.assertEqual(self.render('middle.html', compiled=compiled), '<Base-Middle|[in]>')
+            self.assertEqual(self.render('child.html', ctx, compiled=compiled), '<Base-Middle-Child|[in1in2]>')
+
+    def test_flattened(self):
+        def blocks(nodelist):
+            for node in nodelist:
+                if isinstance(node, BlockNode):
+                    yield node
+                for name in node.child_nodelists:
+                    yield from blocks(getattr(node, name))
+        t = Loader([self.root]).get_template('child.html')
+        self.assertEqual(list(blocks(t.root.nodelist)), [])
+        self.assertEqual(sorted(t.dependencies), ['base.html', 'middle.html'])
+
+    def test_errors(self):
+        self.write('late.html', '{{ x }}{% extends "base.html" %}')
+        self.write('twice.html', '{% block a %}{% endblock %}{% block a %}{% endblock %}')
+        for name in ('late.html', 'twice.html'):
+            with self.assertRaises(TemplateSyntaxError):
+                self.render(name)
+        with self.assertRaises(TemplateSyntaxError):
+            base.Template('{% extends "base.html" %}')
+
+    def test_reload_parent(self):
+        loader = Loader([self.root], check_interval=0)
+        self.write('base.html', '{% block title %}{% endblock %}', mtime=1000)
+        self.assertEqual(loader.get_template('middle.html').render(Context()), '-Middle')
+        self.write('base.html', 'New {% block title %}{% endblock %}', mtime=2000)
+        self.assertEqual(loader.get_template('middle.html').render(Context()), 'New -Middle')
+
+    def test_bytecode_cache(self):
+        cache = BytecodeCache(os.path.join(self.root, 'cache'))
+        self.assertEqual(self.render('middle.html', bytecode_cache=cache), '<Base-Middle|[in]>')
+        self.write('base.html', '{% block title %}{% endblock %}')
+        self.assertEqual(self.render('middle.html', bytecode_cache=cache), '-Middle')
+
+class IncludeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write('item.html', '<{{ x }}>')
+        self.write('list.html', '{% for x in y %}{% include "item.html" %}{% endfor %}')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    write = LoaderTests.write
+
+    def test_static(self):
+        for compiled in (False, True):
+            loader = Loader([self.root], compiled=compiled)
+            t = loader.get_template('list.html')
+            self.assertEqual(t.render(Context({'y': [1, 2]})), '<1><2>')
+        # Spliced in, and merged with the text around it
+        loop, = t.root.nodelist
+        self.assertEqual([node.content for node in loop.nodelist[::2]], ['<', '>'])
+        self.assertEqual(list(t.dependencies), ['item.html'])
+
+    def test_kwargs(self):
+        self.write('page.html', '{% include "item.html" x=a %}{{ x }}')
+        t = Loader([self.root]).get_template('page.html')
+        self.assertEqual(t.render(Context({'a': 1, 'x': 2})), '<1>2')
+
+    def test_dynamic(self):
+        self.write('page.html', '{% for name in names %}{% include name x=name %}{% endfor %}')
+        t = Loader([self.root]).get_template('page.html')
+        ctx = {'names': ['item.html', 'item.html']}
+        self.assertEqual(t.render(Context(ctx)), '<item.html><item.html>')
+        self.assertEqual(''.join(t.stream(Context(ctx))), '<item.html><item.html>')
+        self.assertEqual(asyncio.run(t.render_async(Context(ctx))), '<item.html><item.html>')
+        # The Loader goes with it, without its cache
+        t = pickle.loads(pickle.dumps(t))
+        self.assertEqual(t.render(Context(ctx)), '<item.html><item.html>')
+
+    def test_autoescape(self):
+        # An included template keeps its own escaping, whatever the includer's
+        self.write('page.html',
+            '{% autoescape off %}{% for x in y %}{{ x }}{% include "item.html" %}{% endfor %}{% endautoescape %}'
+        )
+        for compiled in (False, True):
+            t = Loader([self.root], compiled=compiled).get_template('page.html')
+            self.assertEqual(t.render(Context({'y': ['&']})), '&<&amp;>')
+
+    def test_memoised(self):
+        # A dynamic include is part of the same render, so shares its memo
+        calls = []
+        class User(object):
+            def f(self):
+                calls.append(1)
+                return 'f'
+        self.write('page.html', '{{ u.f }}{% include name %}{{ u.f }}')
+        for compiled in (False, True):
+            del calls[:]
+            t = Loader([self.root], compiled=compiled).get_template('page.html')
+            ctx = Context({'u': User(), 'name': 'item.html', 'x': 1}, memoise=True)
+            self.assertEqual(t.render(ctx), 'f<1>f')
+            self.assertEqual(len(calls), 1)
+
+    def test_loop(self):
+        self.write('a.html', '{% include "b.html" %}')
+        self.write('b.html', '{% include "a.html" %}')
+        with self.assertRaises(TemplateSyntaxError):
+            Loader([self.root]).get_template('a.html')
+
+    def test_reload(self):
+        loader = Loader([self.root], check_interval=0)
+        self.write('item.html', 'old', mtime=1000)
+        self.assertEqual(loader.get_template('list.html').render(Context({'y': [1]})), 'old')
+        self.write('item.html', 'new', mtime=2000)
+        self.assertEqual(loader.get_template('list.html').render(Context({'y': [1]})), 'new')
+
+class BytecodeCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.root, 'cache')
+        with open(os.path.join(self.root, 'index.html'), 'w') as fout:
+            fout.write('{% for x in y %}{{ x }},{% endfor %}')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_cold_start(self):
+        for compiled in (False, True):
+            Loader([self.root], compiled=compiled,
+                bytecode_cache=BytecodeCache(self.cache_dir)).get_template('index.html')
+
+            # A new loader finds the template without parsing
+            loader = Loader([self.root], compiled=compiled,
+                bytecode_cache=BytecodeCache(self.cache_dir))
+            parse, base.parse = base.parse, None
+            try:
+                t = loader.get_template('index.html')
+            finally:
+                base.parse = parse
+            self.assertEqual(t.render(Context({'y': [1, 2]})), '1,2,')
+            self.assertEqual(t.func is not None, compiled)
+
+    def test_compiled_layout(self):
+        # Names from extends and include are plain strs, which marshal takes
+        for name, content in (
+            ('base.html', '<{% block a %}{% endblock %}>'),
+            ('part.html', '{{ x }}'),
+            ('page.html', '{% extends "base.html" %}{% block a %}{% include "part.html" %}{% endblock %}'),
+        ):
+            with open(os.path.join(self.root, name), 'w') as fout:
+                fout.write(content)
+        for n in range(2):
+            loader = Loader([self.root], compiled=True, bytecode_cache=BytecodeCache(self.cache_dir))
+            t = loader.get_template('page.html')
+            self.assertEqual(t.render(Context({'x': 1})), '<1>')
+
+    def test_dynamic_include(self):
+        # Templates from the cache include through the live loader
+        for name, content in (('item.html', '<{{ x }}>'), ('page.html', '{% include name %}')):
+            with open(os.path.join(self.root, name), 'w') as fout:
+                fout.write(content)
+        for compiled in (False, True):
+            Loader([self.root], compiled=compiled,
+                bytecode_cache=BytecodeCache(self.cache_dir)).get_template('page.html')
+            loader = Loader([self.root], compiled=compiled,
+                bytecode_cache=BytecodeCache(self.cache_dir))
+            t = loader.get_template('page.html')
+            self.assertEqual(t.render(Context({'name': 'item.html', 'x': 1})), '<1>')
+            self.assertEqual(t.render(Context({'name': 'item.html', 'x': 2})), '<2>')
+            self.assertEqual((loader.misses, loader.hits), (2, 1))
+
+    def test_corrupt(self):
+        cache = BytecodeCache(self.cache_dir)
+        key = cache.key('source')
+        with open(cache.path(key), 'wb') as fout:
+            fout.write(b'junk')
+        self.assertIsNone(cache.load(key))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from contemplation import Template, Context
+from contemplation.base import TextNode, VarNode
+
+class OptimiseTests(unittest.TestCase):
+
+    def test_fold(self):
+        t = Template('a{# comment #}b{{ "c" }}{{ 1 }}{{ 2.5 }}d')
+        self.assertEqual(len(t.root.nodelist), 1)
+        self.assertEqual(t.root.nodelist[0].content, 'abc12.5d')
+
+    def test_around_vars(self):
+        t = Template('{# x #}{{ "<" }}{{ x }}{{ ">" }}{# y #}')
+        nodes = t.root.nodelist
+        self.assertEqual([type(node) for node in nodes], [TextNode, VarNode, TextNode])
+        self.assertEqual(t.render(Context({'x': 1})), '<1>')
+
+    def test_empty(self):
+        t = Template('{# x #}')
+        self.assertEqual(len(t.root.nodelist), 0)
+        self.assertEqual(t.render(Context()), '')
+
+    def test_nested(self):
+        t = Template('{% for x in y %}[{# - #}{{ x }}]{% endfor %}{% with a=1 %}{{ "a" }}{% endwith %}')
+        loop, block = t.root.nodelist
+        self.assertEqual(len(loop.nodelist), 3)
+        self.assertEqual(len(block.nodelist), 1)
+        self.assertEqual(t.render(Context({'y': [1, 2]})), '[1][2]a')
+
+if __name__ == '__main__':
+    unittest.main()
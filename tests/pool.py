@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pickle
+import subprocess
+import sys
+import unittest
+
+from contemplation import Context, Template, render_many
+
+class RenderManyTests(unittest.TestCase):
+
+    def test_ordered(self):
+        for compiled in (False, True):
+            t = Template('{% for x in y %}{{ x }}{% endfor %}{{ n }}', compiled=compiled)
+            contexts = ({'n': n, 'y': range(n % 3)} for n in range(25))
+            self.assertEqual(
+                list(render_many(t, contexts, workers=2, chunk_size=4)),
+                [t.render(Context({'n': n, 'y': range(n % 3)})) for n in range(25)],
+            )
+
+    def test_unordered(self):
+        t = Template('<{{ n }}>')
+        results = list(render_many(t, ({'n': n} for n in range(10)), workers=2, chunk_size=3, ordered=False))
+        self.assertEqual(sorted(results), [(n, '<%d>' % n) for n in range(10)])
+
+    def test_invalid(self):
+        t = Template('{{ missing }}')
+        self.assertEqual(list(render_many(t, [{}], workers=1, invalid='?')), ['?'])
+
+    def test_new_process(self):
+        # Loading in a process with a different slot table still works
+        t = Template('{% with a=b %}{% for x in a %}{{ x }}{{ forloop.counter }}{% endfor %}{% endwith %}', compiled=True)
+        script = (
+            'import pickle, sys\n'
+            'from contemplation import Context, Template\n'
+            'from contemplation.context import slot_for\n'
+            'for name in "zyxwvutsrq": slot_for(name)\n'
+            't = pickle.loads(sys.stdin.buffer.read())\n'
+            'sys.stdout.write(t.render(Context({"b": "pq"})))\n'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script], input=pickle.dumps(t),
+            stdout=subprocess.PIPE, check=True,
+        ).stdout
+        self.assertEqual(output, b'p1q2')
+
+if __name__ == '__main__':
+    unittest.main()
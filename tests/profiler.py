@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from contemplation import Context, Loader, Profiler, Template
+from contemplation.profiler import ProfiledNode
+
+class ProfilerTests(unittest.TestCase):
+
+    def test_stats(self):
+        t = Template('a\n{% for x in y %}\n{{ x|upper }}{% endfor %}\n{{ z }}', name='t.html', compiled=True)
+        profiler = Profiler()
+        data = {'y': 'abc', 'z': 'é'}
+        self.assertEqual(profiler.render(t, Context(data)), t.render(Context(data)))
+        stats = profiler.stats
+        loop = stats['t.html', 2, '{% for %}']
+        var = stats['t.html', 3, '{{ x|upper }}']
+        self.assertEqual((loop.calls, loop.size), (1, 6))
+        self.assertEqual((var.calls, var.size), (3, 3))
+        # Output is counted in UTF-8 bytes
+        self.assertEqual(stats['t.html', 4, '{{ z }}'].size, 2)
+        self.assertGreaterEqual(loop.cumulative, var.cumulative)
+        self.assertLessEqual(loop.own, loop.cumulative)
+        self.assertEqual(profiler.table().splitlines()[1].split()[-2:], ['t.html:0', '<template>'])
+
+    def test_collapsed(self):
+        t = Template('{% for x in y %}{{ x }}{% endfor %}', name='t.html')
+        profiler = Profiler()
+        profiler.render(t, Context({'y': [1, 2]}))
+        profiler.render(t, Context({'y': [3]}))
+        stacks = [line.rsplit(' ', 1)[0] for line in profiler.collapsed().splitlines()]
+        self.assertEqual(stacks, [
+            't.html:0 <template>',
+            't.html:0 <template>;t.html:1 {% for %}',
+            't.html:0 <template>;t.html:1 {% for %};t.html:1 {{ x }}',
+        ])
+        self.assertEqual(profiler.stats['t.html', 1, '{{ x }}'].calls, 3)
+
+    def test_unchanged(self):
+        # The template's own nodes aren't instrumented
+        t = Template('{{ a }}{% with b=a %}{{ b }}{% endwith %}')
+        Profiler().render(t, Context({'a': 1}))
+        nodes = list(t.root.nodelist) + list(t.root.nodelist[1].nodelist)
+        for node in nodes:
+            self.assertNotIsInstance(node, ProfiledNode)
+
+    def test_loaded(self):
+        # Included nodes are reported under the template they came from
+        root = tempfile.mkdtemp()
+        try:
+            for name, content in (('base.html', '<{% block a %}{% endblock %}>'), ('part.html', '\n{{ x }}')):
+                with open(os.path.join(root, name), 'w') as fout:
+                    fout.write(content)
+            t = Template('{% extends "base.html" %}{% block a %}{% include "part.html" %}{% endblock %}', loader=Loader([root]))
+            profiler = Profiler()
+            self.assertEqual(profiler.render(t, Context({'x': 1})), '<\n1>')
+            self.assertIn(('part.html', 2, '{{ x }}'), profiler.stats)
+        finally:
+            shutil.rmtree(root)
+
+if __name__ == '__main__':
+    unittest.main()
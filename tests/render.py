@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import asyncio
 import unittest
 
 from contemplation import Template, Context, TemplateSyntaxError
+from contemplation import base
+from contemplation.base import tokenise, position
+from contemplation.context import SLOTS, slot_for
+from contemplation.safestring import SafeString, conditional_escape, escape, mark_safe
 
 class SomeException(Exception):
     silent_variable_failure = True
@@ -309,5 +314,258 @@ class RenderTests(unittest.TestCase):
                 c = Context(ctx)
                 o = t.render(c)
 
+class TokeniseTests(unittest.TestCase):
+
+    def test_offsets(self):
+        source = 'a\nb{{ x }}\n  {% with a=1 %}{# c #}{% endwith %}'
+        tokens = [
+            (mode, tok, position(source, offset))
+            for mode, tok, offset in tokenise(source)
+        ]
+        self.assertEqual(tokens, [
+            (0, 'a\nb', (1, 0)),
+            (1, 'x', (2, 1)),
+            (0, '\n  ', (2, 8)),
+            (2, 'with a=1', (3, 2)),
+            (3, 'c', (3, 16)),
+            (2, 'endwith', (3, 23)),
+        ])
+
+    def test_verbatim(self):
+        t = Template('{% verbatim %}{{ a }}{% endverbatim %}{% verbatim x %}{% endverbatim %}{% endverbatim x %}{{ b }}')
+        self.assertEqual(t.render(Context({'a': 1, 'b': 2})), '{{ a }}{% endverbatim %}2')
+
+    def test_unclosed_verbatim(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% verbatim %}{{ a }}')
+
+class LookupTests(unittest.TestCase):
+
+    def test_repeat_lookups(self):
+        # Cached strategies must not change which lookup wins
+        t = Template('{{ a.0 }}|{{ a.upper }}|{{ a.b.c }}')
+        for data, output in (
+            ({'a': {0: 'Y'}}, 'Y|INVALID|INVALID'),
+            ({'a': ['Z']}, 'Z|INVALID|INVALID'),
+            ({'a': 'abc'}, 'a|ABC|INVALID'),
+            ({'a': {'upper': 'U', 'b': SomeClass()}}, 'INVALID|U|INVALID'),
+            ({'a': {'b': {'c': 'C'}}}, 'INVALID|INVALID|C'),
+        ):
+            self.assertEqual(t.render(Context(data, invalid='INVALID')), output)
+
+    def test_bounded(self):
+        t = Template('{{ a.x }}')
+        for n in range(base.LOOKUP_STRATEGY_SIZE + 10):
+            t.render(Context({'a': type('T%d' % n, (object,), {'x': n})()}))
+        self.assertLessEqual(len(base.LOOKUP_STRATEGY), base.LOOKUP_STRATEGY_SIZE)
+
+class SlotTests(unittest.TestCase):
+
+    def test_shadowing(self):
+        t = Template(
+            '{{ x }}{% for x in a %}({{ x }}{% for x in b %}{{ x }}{% endfor %}{{ x }}){% endfor %}'
+            '{% with x=5 %}{{ x }}{% endwith %}{{ x }}'
+        )
+        for compiled in (False, True):
+            t = Template(t.source, compiled=compiled)
+            c = Context({'x': 0, 'a': [1, 2], 'b': [3]})
+            self.assertEqual(t.render(c), '0(131)(232)50')
+            self.assertEqual(''.join(t.stream(c)), '0(131)(232)50')
+
+    def test_context_lookup(self):
+        # Bound names are visible through the Context mapping interface
+        c = Context({'y': [1]})
+        Template('{% for slot_name in y %}{% endfor %}')
+        slots = c.bind_slots(len(SLOTS))
+        self.assertNotIn('slot_name', c)
+        slots[SLOTS['slot_name']] = 'value'
+        self.assertIn('slot_name', c)
+        self.assertEqual(c['slot_name'], 'value')
+        self.assertEqual(c.get('slot_name'), 'value')
+
+    def test_sized(self):
+        # A Context only holds the slots its tags need
+        t = Template('{% with early_name=1 %}{{ early_name }}{% endwith %}')
+        for n in range(100):
+            slot_for('unused_name_%d' % n)
+        c = Context()
+        self.assertEqual(c.slots, [])
+        self.assertEqual(t.render(c), '1')
+        self.assertEqual(len(c.slots), SLOTS['early_name'] + 1)
+
+class Unsized(object):
+    def __init__(self, *items):
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+class ForLoopTests(unittest.TestCase):
+
+    def render(self, tmpl, ctx):
+        outputs = set()
+        for compiled in (False, True):
+            t = Template(tmpl, compiled=compiled)
+            outputs.add(t.render(Context(ctx)))
+            outputs.add(''.join(t.stream(Context(ctx))))
+        self.assertEqual(len(outputs), 1)
+        return outputs.pop()
+
+    def test_counters(self):
+        tmpl = (
+            '{% for x in y %}{{ forloop.counter }}{{ forloop.counter0 }}'
+            '{{ forloop.revcounter }}{{ forloop.revcounter0 }}'
+            '{{ forloop.first }}{{ forloop.last }},{% endfor %}'
+        )
+        self.assertEqual(self.render(tmpl, {'y': 'ab'}), '1021TrueFalse,2110FalseTrue,')
+
+    def test_iterator(self):
+        # No length is known, but first and last still work
+        tmpl = '{% for x in y %}{{ x }}{{ forloop.last }}{% endfor %}'
+        self.assertEqual(self.render(tmpl, {'y': Unsized(1, 2)}), '1False2True')
+        with self.assertRaises(AttributeError):
+            for loop in Template('{% for x in y %}{% endfor %}').root.nodelist[0].iterate(
+                    Context({'y': Unsized(1)})):
+                loop.revcounter
+
+    def test_parentloop(self):
+        tmpl = (
+            '{% for x in a %}{% for y in b %}'
+            '{{ forloop.parentloop.counter }}{{ forloop.counter }},'
+            '{% endfor %}{{ forloop.parentloop }};{% endfor %}'
+        )
+        self.assertEqual(self.render(tmpl, {'a': 'ab', 'b': 'cd'}), '11,12,None;21,22,None;')
+
+    def test_empty(self):
+        tmpl = '{% for x in y %}{{ x }}{% empty %}none{% endfor %}'
+        self.assertEqual(self.render(tmpl, {'y': []}), 'none')
+        self.assertEqual(self.render(tmpl, {}), 'none')
+        self.assertEqual(self.render(tmpl, {'y': Unsized()}), 'none')
+        self.assertEqual(self.render(tmpl, {'y': [1]}), '1')
+
+    def test_unpack(self):
+        tmpl = '{% for a, b in y %}{{ a }}{{ b }},{% endfor %}'
+        self.assertEqual(self.render(tmpl, {'y': [(1, 2), (3,), 4]}), '12,3,,')
+        # Names given no value don't fall through to the data
+        self.assertEqual(self.render(tmpl, {'y': [(3,), 4], 'a': 'x', 'b': 'x'}), '3,,')
+
+class StreamTests(unittest.TestCase):
+
+    def test_stream(self):
+        t = Template('a{% for x in y %}{% with z=x %}{{ z }}{% endwith %}{% endfor %}b')
+        chunks = list(t.stream(Context({'y': [1, 2]})))
+        self.assertEqual(chunks, ['a', '1', '2', 'b'])
+
+    def test_stream_lazy(self):
+        def rows():
+            yield 1
+            yield 2
+            raise AssertionError('Consumed too far')
+        t = Template('{% for x in y %}<{{ x }}>{% endfor %}')
+        stream = t.stream(Context({'y': rows()}))
+        self.assertEqual([next(stream), next(stream), next(stream)], ['<', '1', '>'])
+
+    def test_render_to(self):
+        t = Template('{% for x in y %}{{ x }}{% endfor %}')
+        out = []
+        t.render_to(Context({'y': range(10)}), out.append, buffer_size=4)
+        self.assertEqual(out, ['0123', '4567', '89'])
+
+class Markup(object):
+    def __html__(self):
+        return '<i>markup</i>'
+
+class AutoEscapeTests(unittest.TestCase):
+
+    def render(self, tmpl, ctx, **kwargs):
+        outputs = set()
+        for compiled in (False, True):
+            t = Template(tmpl, compiled=compiled, **kwargs)
+            outputs.add(t.render(Context(ctx)))
+            outputs.add(''.join(t.stream(Context(ctx))))
+            outputs.add(asyncio.run(t.render_async(Context(ctx))))
+        self.assertEqual(len(outputs), 1)
+        return outputs.pop()
+
+    def test_escape(self):
+        ctx = {'a': '<a href="x">\'&\'</a>', 'b': mark_safe('<b>'), 'c': Markup(), 'd': 1}
+        self.assertEqual(
+            self.render('{{ a }}|{{ b }}|{{ c }}|{{ d }}|{{ "<" }}', ctx),
+            '&lt;a href=&quot;x&quot;&gt;&#x27;&amp;&#x27;&lt;/a&gt;|<b>|<i>markup</i>|1|<',
+        )
+
+    def test_control(self):
+        tmpl = (
+            '{{ a }}{% autoescape off %}{{ a }}'
+            '{% for x in y %}{% autoescape on %}{{ x }}{% endautoescape %}{{ x }}{% endfor %}'
+            '{% endautoescape %}'
+        )
+        self.assertEqual(self.render(tmpl, {'a': '&', 'y': ['<']}), '&amp;&&lt;<')
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% autoescape maybe %}{% endautoescape %}')
+
+    def test_disabled(self):
+        self.assertEqual(self.render('{{ a }}', {'a': '<'}, autoescape=False), '<')
+
+    def test_functions(self):
+        text = 'no specials'
+        self.assertIs(conditional_escape(text), text)
+        self.assertIsInstance(escape('<'), SafeString)
+        self.assertEqual(escape(mark_safe('<')), '&lt;')
+        self.assertEqual(conditional_escape(mark_safe('<')), '<')
+        self.assertIsInstance(conditional_escape(mark_safe('<')), SafeString)
+        self.assertIsInstance(mark_safe('a') + mark_safe('b'), SafeString)
+        self.assertNotIsInstance(mark_safe('a') + 'b', SafeString)
+
+class AsyncTests(unittest.TestCase):
+
+    def render(self, tmpl, ctx):
+        return asyncio.run(Template(tmpl).render_async(Context(ctx)))
+
+    def test_awaitables(self):
+        async def value(x):
+            return x
+
+        class Obj(object):
+            async def method(self):
+                return 'method'
+            attr = value('attr')
+
+        self.assertEqual(
+            self.render('{{ a }} {{ a }} {{ o.method }} {{ o.attr }}', {'a': value(1), 'o': Obj()}),
+            '1 1 method attr',
+        )
+
+    def test_gathered(self):
+        # Both sources must be waited on at once for either to finish
+        async def source(mine, other):
+            mine.set()
+            await asyncio.wait_for(other.wait(), 1)
+            return 'done'
+
+        async def main():
+            a, b = asyncio.Event(), asyncio.Event()
+            t = Template('{{ a }} {% with c=b %}{{ c }}{% endwith %}')
+            return await t.render_async(Context({'a': source(a, b), 'b': source(b, a)}))
+        self.assertEqual(asyncio.run(main()), 'done done')
+
+    def test_async_for(self):
+        async def rows(n):
+            for x in range(n):
+                yield x
+
+        tmpl = '{% for x in y %}{{ x }}{{ forloop.last }},{% empty %}none{% endfor %}{{ x }}'
+        self.assertEqual(self.render(tmpl, {'y': rows(2), 'x': 'x'}), '0False,1True,x')
+        self.assertEqual(self.render(tmpl, {'y': rows(0)}), 'none')
+        self.assertEqual(
+            self.render('{% for x in y reversed %}{{ x }}{% endfor %}', {'y': rows(3)}),
+            '210',
+        )
+
+    def test_matches_render(self):
+        tmpl = '{% for k, v in d.items %}{% with x=k %}{{ x }}{{ v }}{% endwith %}{% endfor %}'
+        ctx = {'d': {'a': 1, 'b': 2}}
+        self.assertEqual(self.render(tmpl, ctx), Template(tmpl).render(Context(ctx)))
+
 if __name__ == '__main__':
     unittest.main()